@@ -14,6 +14,7 @@ from coffea.hist import plot
 from cycler import cycler
 from topcoffea.plotter.OutText import OutText
 from topcoffea.modules.HistEFT import HistEFT
+from topcoffea.modules.EFTEvaluator import EFTEvaluator
 from topcoffea.modules.WCPoint import WCPoint
 from topcoffea.modules.WCFit import WCFit
 from matplotlib.widgets import Slider, Button, RadioButtons
@@ -44,24 +45,26 @@ h = h.sum('sample')
 # Get the histogram with the sum of weights, for normalization
 hsow = hists['SumOfEFTweights']
 hsow = hsow.sum('sample')
-hsow.SetSMpoint()
-smsow = hsow.values()[()][0]
+
+# Evaluators for the histograms: moving a slider only updates the bins for that WC
+ev = EFTEvaluator(h)
+evsow = EFTEvaluator(hsow)
+smsow = evsow.values()[()][0]
 
 # The SM point -- this won't be updated
-hSM = h.copy()
-hSM.SetSMpoint()
+hSM = ev.hist()
 hSM.scale(1./smsow)
 
 # Draw at SM point
-h.SetSMpoint()
-h.scale(1./smsow)
-hist.plot1d(h, ax=ax, line_opts={'color':'orange'})
+hplot = ev.hist(sumw2=False)
+hplot.scale(1./smsow)
+hist.plot1d(hplot, ax=ax, line_opts={'color':'orange'})
 
 # Create sliders
 sliders = {}; saxes = []
 ypos_min = 0.1
 ypos_max = 0.9
-wcnames = h.GetWCnames()
+wcnames = ev.wc_names
 ystep = (ypos_max-ypos_min)/len(wcnames)
 for i in range(len(wcnames)): 
   ypos = ypos_min+ystep*i
@@ -70,15 +73,15 @@ for i in range(len(wcnames)):
 
 # This function is called when moving a slider
 def updatePlot(amount, name):
-  norm = h.values()[()][0]
-  h.SetStrength(name, amount)
-  hsow.SetStrength(name, amount)
-  norm = hsow.values()[()][0]
-  h.scale(1./norm)
-  hist.plot1d(h, ax=ax, line_opts={'color':'orange'})
+  ev.set_wc(name, amount)
+  evsow.set_wc(name, amount)
+  norm = evsow.values()[()][0]
+  hplot = ev.hist(sumw2=False)
+  hplot.scale(1./norm)
+  hist.plot1d(hplot, ax=ax, line_opts={'color':'orange'})
   hist.plot1d(hSM, ax=ax, clear=False, line_opts={'color':'black'})
-  hist.plot1d(h, ax=ax, clear=False, line_opts={'color':'orange'})
-  hist.plotratio(h, hSM, ax=rax, clear=True, denom_fill_opts={}, error_opts={'linestyle':'none', 'marker': '.', 'markersize': 10., 'color':'k', 'elinewidth': 1}, guide_opts={}, unc='num')
+  hist.plot1d(hplot, ax=ax, clear=False, line_opts={'color':'orange'})
+  hist.plotratio(hplot, hSM, ax=rax, clear=True, denom_fill_opts={}, error_opts={'linestyle':'none', 'marker': '.', 'markersize': 10., 'color':'k', 'elinewidth': 1}, guide_opts={}, unc='num')
   rax.set_ylim(0, 3)
   rax.set_ylabel('Ratio to SM')
   fig.canvas.draw_idle()
@@ -17,6 +17,7 @@ from coffea.nanoevents import NanoAODSchema
 import topeft
 from topcoffea.modules import samples
 from topcoffea.modules import fileReader
+from topcoffea.modules.histio import save_hists
 
 if __name__ == '__main__':
 
@@ -34,6 +35,7 @@ if __name__ == '__main__':
   parser.add_argument('--treename'   , default='Events', help = 'Name of the tree inside the files')
   parser.add_argument('--do-errors', action='store_true', help = 'Save the w**2 coefficients')
   parser.add_argument('--do-systs', action='store_true', help = 'Run over systematic samples (takes longer)')
+  parser.add_argument('--columnar', action='store_true', help = 'Save the output in the columnar (memory-mappable) format, see topcoffea/modules/histio.py')
 
   args = parser.parse_args()
   jsonFiles  = args.jsonFiles
@@ -155,7 +157,11 @@ if __name__ == '__main__':
   #    with lz4f.open("pods/"+options.year+"/"+dataset+".pkl.gz", mode="xb", compression_level=5) as fout:
   if not outpath.endswith('/'): outpath += '/'
   if not os.path.isdir(outpath): os.system("mkdir -p %s"%outpath)
-  print('Saving output in %s...'%(outpath + outname + ".pkl.gz"))
-  with gzip.open(outpath + outname + ".pkl.gz", "wb") as fout:
-    cloudpickle.dump(output, fout)
+  if args.columnar:
+    print('Saving output in %s...'%(outpath + outname))
+    save_hists(output, outpath + outname)
+  else:
+    print('Saving output in %s...'%(outpath + outname + ".pkl.gz"))
+    with gzip.open(outpath + outname + ".pkl.gz", "wb") as fout:
+      cloudpickle.dump(output, fout)
   print('Done!')
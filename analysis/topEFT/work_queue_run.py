@@ -17,6 +17,7 @@ from coffea.nanoevents import NanoAODSchema
 import topeft
 from topcoffea.modules import samples
 from topcoffea.modules import fileReader
+from topcoffea.modules.histio import save_hists
 import topeftenv
 
 import argparse
@@ -30,6 +31,7 @@ parser.add_argument('--outname','-o'   , default='plotsTopEFT', help = 'Name of
 parser.add_argument('--outpath','-p'   , default='histos', help = 'Name of the output directory')
 parser.add_argument('--treename'       , default='Events', help = 'Name of the tree inside the files')
 parser.add_argument('--do-errors'      , action='store_true', help = 'Save the w**2 coefficients')
+parser.add_argument('--columnar'       , action='store_true', help = 'Save the output in the columnar (memory-mappable) format, see topcoffea/modules/histio.py')
 
 args = parser.parse_args()
 jsonFiles  = args.jsonFiles
@@ -160,8 +162,12 @@ print("Filled %.0f bins, nonzero bins: %1.1f %%" % (nbins, 100*nfilled/nbins,))
 #    with lz4f.open("pods/"+options.year+"/"+dataset+".pkl.gz", mode="xb", compression_level=5) as fout:                                                                                                   
 if not outpath.endswith('/'): outpath += '/'
 if not os.path.isdir(outpath): os.system("mkdir -p %s"%outpath)
-print('Saving output in %s...'%(outpath + outname + ".pkl.gz"))
-with gzip.open(outpath + outname + ".pkl.gz", "wb") as fout:
-  cloudpickle.dump(output, fout)
+if args.columnar:
+  print('Saving output in %s...'%(outpath + outname))
+  save_hists(output, outpath + outname)
+else:
+  print('Saving output in %s...'%(outpath + outname + ".pkl.gz"))
+  with gzip.open(outpath + outname + ".pkl.gz", "wb") as fout:
+    cloudpickle.dump(output, fout)
 print('Done!')
 
@@ -0,0 +1,243 @@
+"""
+ CoeffBlock class - contiguous storage for the EFT coefficient arrays of a HistEFT
+ Behaves like the {sparse key: array} dict used by coffea.hist.Hist, but all the arrays with the full
+ (*dense_shape, ncoeffs) shape are rows of a single preallocated (nrows, *dense_shape, ncoeffs) ndarray.
+ Indexing a key gives a view into that array, so in-place operations (e.g. h._sumw[key] += x) act on the block.
+ Anything else (non-EFT bins, None placeholders for bins without errors) is kept in a regular dict.
+
+ The point of this is that operations over all the sparse bins (adding histograms, integrating over sparse
+ axes, evaluating the bin contents) can be done with a handful of numpy operations on the whole block.
+
+ The block can also live in a memory-mapped file (directory option), for histograms that don't fit in memory.
+ The operations over all the rows then stream over chunks of rows (see chunks()), so that only a chunk at a
+ time is read into memory.
+"""
+
+import tempfile
+import numpy as np
+from collections.abc import MutableMapping
+
+class CoeffBlock(MutableMapping):
+
+  _directory = None
+  _chunk_bytes = 64 << 20 # Size of the chunks of rows read at once from a memory-mapped block
+
+  def __init__(self, row_shape, dtype=np.float64, capacity=16, directory=None):
+    """ Initialize an empty block, rows have shape row_shape (i.e. (*dense_shape, ncoeffs))
+        directory: if given, the block is kept in a memory-mapped file in this (scratch) directory
+    """
+    self._row_shape = tuple(row_shape)
+    self._dtype = np.dtype(dtype)
+    self._directory = directory
+    self._array = self._allocate(max(capacity, 1))
+    self._nrows = 0
+    self._free = []   # Rows released by deleted keys, reused before growing the block
+    self._index = {}  # sparse key -> row in self._array, or -1 if the value lives in self._other
+    self._other = {}  # sparse key -> any value that is not a full coefficient row
+
+  @classmethod
+  def from_array(cls, array, keys):
+    """ Block using array (e.g. a memory-mapped file) as storage, row i holding the coefficients of keys[i] """
+    out = cls.__new__(cls)
+    out._row_shape = tuple(array.shape[1:])
+    out._dtype = array.dtype
+    out._array = array
+    out._directory = None
+    out._nrows = len(keys)
+    out._free = []
+    out._index = {key: row for row, key in enumerate(keys)}
+    out._other = {}
+    if out._array.shape[0] == 0:
+      out._array = np.zeros((1, *out._row_shape), dtype=out._dtype)
+    return out
+
+  def _allocate(self, nrows):
+    """ Zeroed (nrows, *row_shape) array, in memory or in an anonymous file of the directory (removed when unmapped) """
+    if self._directory is None:
+      return np.zeros((nrows, *self._row_shape), dtype=self._dtype)
+    with tempfile.TemporaryFile(dir=self._directory) as fout:
+      return np.memmap(fout, dtype=self._dtype, mode='w+', shape=(nrows, *self._row_shape))
+
+  @property
+  def row_shape(self):
+    return self._row_shape
+
+  @property
+  def dtype(self):
+    return self._dtype
+
+  @property
+  def array(self):
+    """ The (nrows, *row_shape) array holding all the rows in use (may include zeroed free rows) """
+    return self._array[:self._nrows]
+
+  @property
+  def on_disk(self):
+    """ Whether the rows are memory-mapped from a file """
+    return isinstance(self._array, np.memmap)
+
+  def chunks(self, nrows, row_nbytes=None, on_disk=None):
+    """ Slices splitting nrows (>= 0) rows in the chunks that are processed at once: a single chunk for a block
+        in memory, chunks of about _chunk_bytes (for rows of row_nbytes bytes) for a block on disk
+    """
+    if on_disk is None: on_disk = self.on_disk
+    if not on_disk or nrows == 0: return [slice(0, nrows)]
+    if row_nbytes is None: row_nbytes = self._array[0].nbytes
+    step = max(1, self._chunk_bytes // max(row_nbytes, 1))
+    return [slice(start, min(start+step, nrows)) for start in range(0, nrows, step)]
+
+  def _grow(self, nrows):
+    """ Make sure there is room for at least nrows rows, doubling the capacity as needed """
+    capacity = self._array.shape[0]
+    if nrows <= capacity: return
+    while capacity < nrows: capacity *= 2
+    new_array = self._allocate(capacity)
+    for chunk in self.chunks(self._nrows):
+      new_array[chunk] = self._array[chunk]
+    self._array = new_array
+
+  def alloc(self, key):
+    """ Return the row for key, adding a zeroed row if the key does not have one yet """
+    row = self._index.get(key, -1)
+    if row >= 0: return row
+    self._other.pop(key, None)
+    if self._free:
+      row = self._free.pop()
+    else:
+      self._grow(self._nrows + 1)
+      row = self._nrows
+      self._nrows += 1
+    self._index[key] = row
+    return row
+
+  def alloc_rows(self, keys):
+    """ Vectorized version of alloc(), returns an array with the rows for all the keys """
+    keys = list(keys)
+    nnew = sum(1 for k in keys if self._index.get(k, -1) < 0)
+    self._grow(self._nrows + max(nnew - len(self._free), 0))
+    return np.fromiter((self.alloc(k) for k in keys), dtype=np.intp, count=len(keys))
+
+  def add_rows(self, rows, values):
+    """ Scatter-add values, of shape (len(rows), *row_shape), into the given rows (which may repeat) """
+    rows = np.asarray(rows, dtype=np.intp)
+    if len(rows) == 0: return
+    order = np.argsort(rows, kind='stable')
+    sorted_rows = rows[order]
+    starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+    if len(starts) == len(rows):
+      self._array[rows] += values
+    else:
+      self._array[sorted_rows[starts]] += np.add.reduceat(values[order], starts, axis=0)
+
+  def add_from(self, rows, src, src_rows, op=None):
+    """ Add op(src[src_rows]) into the given rows, chunk by chunk when either array is on disk
+        src: (n, ...) array of source rows, op: optional operation on a stack of source rows (e.g. a sum over
+        some dense axes) giving a (len(chunk), *row_shape) array
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    src_rows = np.asarray(src_rows, dtype=np.intp)
+    if len(rows) == 0: return
+    for chunk in self.chunks(len(rows), src[0].nbytes, self.on_disk or isinstance(src, np.memmap)):
+      values = src[src_rows[chunk]]
+      self.add_rows(rows[chunk], values if op is None else op(values))
+
+  def row(self, key):
+    """ Row index of key, or -1 if the key is not stored as a coefficient row """
+    return self._index.get(key, -1)
+
+  def row_items(self):
+    """ Iterate over (key, row) for the keys stored as coefficient rows """
+    return ((k, r) for k, r in self._index.items() if r >= 0)
+
+  def other_items(self):
+    """ Iterate over (key, value) for the keys not stored as coefficient rows """
+    return self._other.items()
+
+  def is_row(self, value):
+    """ Check if value has the right shape to be stored as a coefficient row """
+    return isinstance(value, np.ndarray) and value.shape == self._row_shape
+
+  def __getitem__(self, key):
+    row = self._index[key]
+    if row >= 0: return self._array[row]
+    return self._other[key]
+
+  def __setitem__(self, key, value):
+    if self.is_row(value):
+      row = self.alloc(key)
+      self._array[row] = value
+    else:
+      row = self._index.get(key, -1)
+      if row >= 0:
+        self._array[row] = 0
+        self._free.append(row)
+      self._index[key] = -1
+      self._other[key] = value
+
+  def __delitem__(self, key):
+    row = self._index.pop(key)
+    if row >= 0:
+      self._array[row] = 0
+      self._free.append(row)
+    else:
+      del self._other[key]
+
+  def __iter__(self):
+    return iter(self._index)
+
+  def __len__(self):
+    return len(self._index)
+
+  def __contains__(self, key):
+    return key in self._index
+
+  def empty_like(self):
+    """ Empty block with the same row shape, dtype and directory """
+    return CoeffBlock(self._row_shape, self._dtype, directory=self._directory)
+
+  def view(self, keys):
+    """ Block with only the given keys, sharing the array of this one (neither should be modified while both are in use) """
+    out = CoeffBlock.__new__(CoeffBlock)
+    out._row_shape = self._row_shape
+    out._dtype = self._dtype
+    out._array = self._array
+    out._directory = self._directory
+    out._nrows = self._nrows
+    out._free = []
+    out._index = {key: self._index[key] for key in keys}
+    out._other = {key: self._other[key] for key in keys if out._index[key] < 0}
+    return out
+
+  def copy(self):
+    """ Copy, the rows in use are packed at the start of the new block """
+    rows = [(k, r) for k, r in self._index.items() if r >= 0]
+    out = CoeffBlock(self._row_shape, self._dtype, capacity=len(rows), directory=self._directory)
+    identity = len(rows) == self._nrows and all(r == i for i, (_, r) in enumerate(rows))
+    src_rows = np.fromiter((r for _, r in rows), dtype=np.intp, count=len(rows))
+    for chunk in self.chunks(len(rows)):
+      out._array[chunk] = self._array[chunk] if identity else self._array[src_rows[chunk]]
+    out._nrows = len(rows)
+    new_rows = {k: i for i, (k, _) in enumerate(rows)}
+    out._index = {k: new_rows.get(k, -1) for k in self._index}
+    out._other = {k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in self._other.items()}
+    return out
+
+  def __copy__(self):
+    return self.copy()
+
+  def __deepcopy__(self, memo):
+    return self.copy()
+
+  def __getstate__(self):
+    # Only ship the rows in use, not the spare capacity (nor free rows or the rows of other keys for a view).
+    # A block on disk is unpickled in memory, the scratch directory may not exist on the other side
+    packed = self.copy()
+    state = packed.__dict__.copy()
+    state['_array'] = np.asarray(packed._array[:packed._nrows])
+    state.pop('_directory', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    if self._array.shape[0] == 0:
+      self._array = np.zeros((1, *self._row_shape), dtype=self._dtype)
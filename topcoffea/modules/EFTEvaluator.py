@@ -0,0 +1,117 @@
+"""
+ EFTEvaluator: bin contents of a HistEFT at a WC point that is changed one WC at a time (e.g. with sliders)
+
+ Each bin content is the quadratic form y = x @ A @ x, with x = [1]+WC values (see HistEFT.quadratic_forms).
+ The evaluator keeps, for every bin, y and the vector v = A @ x at the current point.  When only the WC k
+ changes by d, x changes by d in a single entry, so
+     y -> y + 2*d*v[k] + d**2*A[k,k]
+     v -> v + d*A[k,:]
+ which costs O(nbins*nwc), instead of O(nbins*nwc**2) to evaluate all the bins from scratch.  The rounding errors
+ of the updates add up, so the bins are evaluated from scratch again every _max_updates updates, and for the
+ steps that are large compared to the current WC values (where y is the small difference of large terms).
+
+ Example:
+   ev = EFTEvaluator(h)
+   ev.set_wc('ctW', 1.5)   # fast
+   h_ctW = ev.hist()       # coffea Hist with the bin contents at the current point, e.g. for hist.plot1d
+"""
+
+import numpy as np
+import coffea.hist
+
+class EFTEvaluator:
+
+  _max_updates = 100 # Incremental updates between two evaluations from scratch
+  _max_step = 10.    # Steps larger than this times the largest WC value (or 1) are evaluated from scratch
+
+  def __init__(self, h, point=None):
+    """ Precompute the quadratic forms of all the bins of the HistEFT h (including the under/overflow bins)
+        point: WC values to start from (the SM, i.e. all WCs at 0, by default)
+    """
+    self._label = h._label
+    self._axes = h.axes()
+    self._sparse_keys = list(h._sumw.keys())
+    self._wcnames = list(h._wcnames) if isinstance(h._wcnames, list) else ['c%i' % i for i in range(h._nwc)]
+    forms = h.quadratic_forms(overflow='allnan')
+    self._id_keys = list(forms.keys())
+    self._shapes = [forms[key].shape[:-2] for key in self._id_keys]
+    nx = h._nwc + 1
+    self._forms = np.concatenate([forms[key].reshape(-1, nx, nx) for key in self._id_keys]) if forms else np.zeros((0, nx, nx))
+    self._dense_dim = h.dense_dim()
+    # The sums of squared weights are quartic in the WCs, hist() evaluates them from a view of h (see HistEFT.__getitem__)
+    self._sumw2_hist = h[...] if h._sumw2 is not None else None
+    self.set_point(np.zeros(h._nwc) if point is None else point)
+
+  @property
+  def wc_names(self):
+    return list(self._wcnames)
+
+  @property
+  def point(self):
+    """ Current WC values (a copy) """
+    return self._x[1:].copy()
+
+  def _wc_index(self, wc):
+    if isinstance(wc, str): return self._wcnames.index(wc)
+    return int(wc)
+
+  def set_point(self, point):
+    """ Move to a new WC point, evaluating all the bins from scratch """
+    point = np.asarray(point, dtype=float)
+    if point.shape != (len(self._wcnames),):
+      raise ValueError("Wrong number of WC values.  Expecting {}, received {}".format(len(self._wcnames), point.size))
+    self._x = np.concatenate(([1.0], point))
+    self._v = self._forms @ self._x
+    self._y = self._v @ self._x
+    self._updates = 0
+
+  def set_sm(self):
+    """ Move to the SM point (all the WCs at 0) """
+    self.set_point(np.zeros(len(self._wcnames)))
+
+  def set_wc(self, wc, value):
+    """ Change the value of a single WC (name or index), updating all the bins in O(nbins*nwc) """
+    k = self._wc_index(wc) + 1
+    d = float(value) - self._x[k]
+    if d == 0: return
+    if self._updates + 1 >= self._max_updates or abs(d) > self._max_step*max(1.0, np.max(np.abs(self._x[1:]))):
+      point = self._x[1:].copy()
+      point[k-1] = value
+      self.set_point(point)
+      return
+    self._updates += 1
+    row = self._forms[:, k, :]
+    self._y += 2*d*self._v[:, k] + d*d*row[:, k]
+    self._v += d*row
+    self._x[k] = value
+
+  def values(self, overflow='none'):
+    """ Bin contents at the current point, as returned by HistEFT.values() (copies, not views of the evaluator state) """
+    out, start = {}, 0
+    for key, shape in zip(self._id_keys, self._shapes):
+      n = int(np.prod(shape))
+      arr = self._y[start:start+n].reshape(shape)
+      start += n
+      if self._dense_dim > 0:
+        arr = arr[tuple(coffea.hist.hist_tools.overflow_behavior(overflow) for _ in range(self._dense_dim))]
+      out[key] = arr.copy()
+    return out
+
+  def hist(self, sumw2=True):
+    """ Plain coffea Hist with the bin contents at the current point
+        sumw2: if True, also evaluate the sums of squared weights (when the HistEFT has them).  These are not
+               updated incrementally: each call evaluates all the error coefficients, so turn it off for fast updates
+    """
+    out = coffea.hist.Hist(self._label, *self._axes)
+    if not sumw2 or self._sumw2_hist is None:
+      sumw2 = None
+    else:
+      out._sumw2 = {}
+      sumw2 = self._sumw2_hist.values_at(self._x[None, 1:], sumw2=True, overflow='allnan')
+    start = 0
+    for key, id_key, shape in zip(self._sparse_keys, self._id_keys, self._shapes):
+      n = int(np.prod(shape))
+      out._sumw[key] = self._y[start:start+n].reshape(shape).copy()
+      if sumw2 is not None: out._sumw2[key] = np.array(sumw2[id_key][1][0])
+      start += n
+    return out
@@ -2,87 +2,208 @@
 """
 
 import numpy as np
+import scipy.sparse
+import scipy.linalg.blas
+import threading
+from collections import OrderedDict
 
 class EFTHelper:
 
-    def __init__(self, wc_names):
+    # Default bound on the temporary memory used by calc_w2_coeffs() (in bytes)
+    w2_block_bytes = 64*1024**2
+
+    # Helpers shared by all the users of the same list of WCs, see shared()
+    _shared_helpers = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, wc_names, linear=False):
+        """Get the helper for a list of WCs, built once per process and shared by all its users.
+
+        The helpers only hold tables that depend on the WC names (and a cache of monomials), so the
+        histograms with the same WCs can all use the same one instead of building the tables again.
+        Args:
+            wc_names: Array listing the Wilson coefficients being used
+            linear: Whether the helper only has the constant and linear terms (see the constructor)
+
+        Returns:
+            The EFTHelper for this list of WCs.
+        """
+        key = (tuple(wc_names),bool(linear))
+        helper = cls._shared_helpers.get(key)
+        if helper is None:
+            with cls._shared_lock:
+                helper = cls._shared_helpers.get(key)
+                if helper is None:
+                    helper = cls._shared_helpers[key] = cls(list(wc_names),linear=linear)
+        return helper
+
+    def __init__(self, wc_names, cache_size=8, linear=False):
         """Constructor
         
         Primarily constructs a collection of arrays that will be used to do calculations of w or w**2.
         Args:
             wc_names: Array listing the Wilson coefficients being used
+            cache_size: Number of WC points for which the monomial vectors are kept (see get_monomials())
+            linear: If True, the weights only have the constant (SM) and linear (interference) terms, i.e.
+                    1+nwc coefficients instead of (1+nwc)*(2+nwc)/2.  All the methods work the same way
+                    with the smaller set of coefficients (and w**2 is then a quadratic function)
         """
 
+        # Least recently used cache of the monomial vectors, keyed by (kind, WC values)
+        self._cache_size = cache_size
+        self._monomial_cache = OrderedDict()
+        self._lock = threading.RLock()
+
         # Produces an array which tells us which elements from an
         # array which is [1]+wc_values should be multiplied together
         # to calculate the weight from the quadratic coefficients.
         self.quadratic_pairs = np.asarray(np.tril_indices(len(wc_names)+1)).transpose()
-        # Tells us which quadratic coefficients should be multiplied together to give the quartic for w**2
-        self.w2_pairs = np.asarray(np.tril_indices(len(self.quadratic_pairs))).transpose()
+        # In linear mode only the products with the SM entry of the array are kept
+        self._linear = linear
+        if linear: self.quadratic_pairs = self.quadratic_pairs[self.quadratic_pairs[:,1]==0]
+
+        # The tables for w**2 are much larger, they are only built when first needed (see _build_quartic_tables())
+        self._quartic_tables = None
+
+    def _build_quartic_tables(self):
+        """Build the tables used for w**2, on first use (thread-safe, they are shared with other threads through shared())."""
+        with self._lock:
+            if self._quartic_tables is not None: return self._quartic_tables
+            nx = self.quadratic_pairs[-1,0]+1 # Size of the [1]+wc_values array
+            # Tells us which quadratic coefficients should be multiplied together to give the quartic for w**2
+            w2_pairs = np.asarray(np.tril_indices(len(self.quadratic_pairs))).transpose()
         
-        # This next bit is a little convoluted.  We want two things:
-        #  1) An array that tells us which WC values to multiply by each term in our quartic function.
-        #  2) An array that helps us map each term in the result of squaring the quadratic expression
-        #     for the weight to the unique term in the quartic function.
-        # On our way there, we'll need a few intermediate arrays.
-        # Since we won't use them outside this constructor, we'll just
-        # store them in local variables.
-
-        # Tells us values from an array which is [1]+wc_values should
-        # be multiplied together to caluclate w**2 from the quartic
-        # function.  Note, duplicate terms have not been combined
-        # here, so this is just an intermediate item.  The sort is to
-        # make it so that we can tell that [0,1,1,1] and [1,0,1,1] are
-        # really the same thing.
-        quartic_factors = np.sort(
-            np.hstack((self.quadratic_pairs[self.w2_pairs[:,0]],
-                       self.quadratic_pairs[self.w2_pairs[:,1]])),
-            axis=1,
-        )
+            # This next bit is a little convoluted.  We want two things:
+            #  1) An array that tells us which WC values to multiply by each term in our quartic function.
+            #  2) An array that helps us map each term in the result of squaring the quadratic expression
+            #     for the weight to the unique term in the quartic function.
+            # On our way there, we'll need a few intermediate arrays.
+            # Since we won't use them outside this function, we'll just
+            # store them in local variables.
+
+            # Tells us values from an array which is [1]+wc_values should
+            # be multiplied together to caluclate w**2 from the quartic
+            # function.  Note, duplicate terms have not been combined
+            # here, so this is just an intermediate item.  The sort is to
+            # make it so that we can tell that [0,1,1,1] and [1,0,1,1] are
+            # really the same thing.
+            quartic_factors = np.sort(
+                np.hstack((self.quadratic_pairs[w2_pairs[:,0]],
+                           self.quadratic_pairs[w2_pairs[:,1]])),
+                axis=1,
+            )
         
-        # Removes the duplicate terms from above.  This we'll keep
-        # since it will tell us what WC values to combine with each
-        # term in order actually to calculate w**2.
-        self.quartic_unique_factors = np.unique(quartic_factors,axis=0)
+            # Removes the duplicate terms from above.  This we'll keep
+            # since it will tell us what WC values to combine with each
+            # term in order actually to calculate w**2.
+            quartic_unique_factors = np.unique(quartic_factors,axis=0)
         
-        # To get the mapping from the raw results of squaring the
-        # quadratic to the more compact form with the appropriate
-        # terms combined, we'll a clever way to label which unique
-        # term each raw term goes with.  We'll start by calculating a
-        # unique number for each unique term that's a function of
-        # which WC entries get multipled together.  Lacking a better
-        # idea, we'll pretend the four indices into the WC array are
-        # really four indices in a 4-D array, and then use the "global
-        # index" in that array as a number to identify each term.
-        # This is a temporary variable, so we're not storing it.
-        quartic_index_list = np.ravel_multi_index(
-            (self.quartic_unique_factors[:,0],
-             self.quartic_unique_factors[:,1],
-             self.quartic_unique_factors[:,2],
-             self.quartic_unique_factors[:,3],),
-            4*(len(wc_names)+1,)
-        )
-
-        # We also need the index values that each term in the raw
-        # product (before duplicate removals) corresponds to, so let's
-        # use the "ravel_multi_index" trick on that too
-        quartic_indices = np.ravel_multi_index(
-            (quartic_factors[:,0],
-             quartic_factors[:,1],
-             quartic_factors[:,2],
-             quartic_factors[:,3],),
-            4*(len(wc_names)+1,)
-        )
-
-        # To get an array that tells us which "bin" the coefficient
-        # should be summed in, we need to look up each value in
-        # "quartic_indices" and see which array element it maps to in
-        # quartic_index_list, which is parallel to
-        # "quartic_unique_factors" which the array that lets us
-        # multiply everything together.  The function
-        # np.searchsorted() will let us accomplish that.
-        # This gets used later, so it's saved!
-        self.quartic_bins = np.searchsorted(quartic_index_list,quartic_indices)
+            # To get the mapping from the raw results of squaring the
+            # quadratic to the more compact form with the appropriate
+            # terms combined, we'll a clever way to label which unique
+            # term each raw term goes with.  We'll start by calculating a
+            # unique number for each unique term that's a function of
+            # which WC entries get multipled together.  Lacking a better
+            # idea, we'll pretend the four indices into the WC array are
+            # really four indices in a 4-D array, and then use the "global
+            # index" in that array as a number to identify each term.
+            # This is a temporary variable, so we're not storing it.
+            quartic_index_list = np.ravel_multi_index(
+                (quartic_unique_factors[:,0],
+                 quartic_unique_factors[:,1],
+                 quartic_unique_factors[:,2],
+                 quartic_unique_factors[:,3],),
+                4*(nx,)
+            )
+
+            # We also need the index values that each term in the raw
+            # product (before duplicate removals) corresponds to, so let's
+            # use the "ravel_multi_index" trick on that too
+            quartic_indices = np.ravel_multi_index(
+                (quartic_factors[:,0],
+                 quartic_factors[:,1],
+                 quartic_factors[:,2],
+                 quartic_factors[:,3],),
+                4*(nx,)
+            )
+
+            # To get an array that tells us which "bin" the coefficient
+            # should be summed in, we need to look up each value in
+            # "quartic_indices" and see which array element it maps to in
+            # quartic_index_list, which is parallel to
+            # "quartic_unique_factors" which the array that lets us
+            # multiply everything together.  The function
+            # np.searchsorted() will let us accomplish that.
+            # This gets used later, so it's saved!
+            quartic_bins = np.searchsorted(quartic_index_list,quartic_indices)
+
+            # Finally, a sparse matrix doing that mapping in one go: row i
+            # has a single entry, in the column of the unique term that raw
+            # term i goes with.  The entry is 2 for the off-diagonal terms,
+            # since we only keep the "lower triangle" of the square.  It's
+            # stored transposed, i.e. (n_unique_terms, n_raw_terms), which is
+            # the orientation used in calc_w2_coeffs().
+            n_raw = len(w2_pairs)
+            quartic_map = scipy.sparse.csr_matrix(
+                (np.where(w2_pairs[:,0]==w2_pairs[:,1],1.0,2.0),
+                 (quartic_bins,np.arange(n_raw))),
+                shape=(len(quartic_unique_factors),n_raw)
+            )
+
+            self._quartic_tables = (w2_pairs,quartic_unique_factors,quartic_bins,quartic_map)
+            return self._quartic_tables
+
+    @property
+    def w2_pairs(self):
+        """Which quadratic coefficients should be multiplied together to give the quartic for w**2"""
+        return self._build_quartic_tables()[0]
+
+    @property
+    def quartic_unique_factors(self):
+        """Which entries of [1]+wc_values multiply each unique quartic coefficient"""
+        return self._build_quartic_tables()[1]
+
+    @property
+    def quartic_bins(self):
+        """Which unique quartic coefficient each term of the square of the quadratic goes with"""
+        return self._build_quartic_tables()[2]
+
+    @property
+    def quartic_map(self):
+        """Sparse (n_unique_terms, n_raw_terms) matrix collecting the terms of the square into the unique ones"""
+        return self._build_quartic_tables()[3]
+
+    def get_monomials(self,wc_values,kind='w'):
+        """Get the monomial vector for a single set of WC values, caching the last few points.
+
+        Args:
+            wc_values: A 1D array specifying the Wilson coefficients.
+            kind: 'w' for the monomials multiplying the quadratic coefficients, 'w2' for the ones
+                  multiplying the unique quartic coefficients.
+
+        Returns:
+            A read-only 1D array, such that coeffs @ monomials gives the weights (or w**2 values).
+        """
+        wc_values = np.asarray(wc_values,dtype=float)
+        key = (kind,wc_values.tobytes())
+        with self._lock:
+            monomials = self._monomial_cache.get(key)
+            if monomials is not None:
+                self._monomial_cache.move_to_end(key)
+                return monomials
+        if kind == 'w':
+            monomials = self.get_w_monomials(wc_values)
+        elif kind == 'w2':
+            monomials = self.get_w2_monomials(wc_values)
+        else:
+            raise ValueError("Unknown kind of monomials '{}', expecting 'w' or 'w2'".format(kind))
+        monomials.flags.writeable = False
+        with self._lock:
+            self._monomial_cache[key] = monomials
+            while len(self._monomial_cache) > self._cache_size:
+                self._monomial_cache.popitem(last=False)
+        return monomials
 
     def calc_eft_weights(self,q_coeffs,wc_values):
         """Calculate the weights for a specific set of WC values.
@@ -97,12 +218,11 @@ class EFTHelper:
             An array of the weight values calculated from the quadratic parameterization.
         """
 
-        # Prepend "1" to the start of the WC array to account for constant and linear terms
-        wcs = np.hstack((np.array([1]),wc_values))
-        # multiply the WC values by the quadratic coefficiencts and sum to get the weights.
-        return np.sum(q_coeffs*wcs[self.quadratic_pairs[:,0]]*wcs[self.quadratic_pairs[:,1]],axis=-1)
+        # Contract the coefficients with the (cached) products of the WC values, this avoids
+        # any temporary arrays the size of q_coeffs
+        return np.tensordot(q_coeffs,self.get_monomials(wc_values,'w'),axes=([-1],[0]))
 
-    def calc_w2_coeffs(self,q_coeffs):
+    def calc_w2_coeffs(self,q_coeffs,max_block_bytes=None):
         """Calculate the quartic coefficients for calculating the w**2 value (needed for histogram errors.
 
         Args: 
@@ -110,6 +230,9 @@ class EFTHelper:
                       parameterizing the weights.  The last dimension should
                       specify the coefficients, while any earlier dimensions
                       might be for different histogram bins, events, etc.
+            max_block_bytes: Bound on the temporary memory used for the
+                      calculation (defaults to EFTHelper.w2_block_bytes).
+                      The rows are processed in blocks that fit in it.
 
         Returns: An array with the quartic coefficients organized
             according to unique terms.  In other words, there is only
@@ -117,37 +240,69 @@ class EFTHelper:
             of the various Wilson coefficients.
 
         """
-
-        # First we square the quadratic for calculating the weight
-        # value.  Note: this results in multiple terms that would be
-        # multipled by the same powers of different Wilson
-        # coefficients, so after we do this squaring, we'll be
-        # collecting those terms to together to shorten the lenght of
-        # the array.  Note 2: The factor of two is because we're only
-        # doing the "lower triangle" of the full matrix multiplication
-        quartic_coeffs = np.where(self.w2_pairs[:,0]==self.w2_pairs[:,1],
-                                  q_coeffs[:,self.w2_pairs[:,0]]*q_coeffs[:,self.w2_pairs[:,1]],
-                                  2*q_coeffs[:,self.w2_pairs[:,0]]*q_coeffs[:,self.w2_pairs[:,1]]
-                                  )
-
-        # Now we need to resolve the double counting.  We're going to
-        # use np.bincount to do the heavy lifting, but the problem is
-        # that we might have many entries in q_coeffs (different
-        # events) and we don't want to just sum across all of those.
-        # There is no way to ask bincount to sum things row-by-row in
-        # the matrix, so we'll relabel the bins so that each row has
-        # unique bin numbers and then trick bincount into doing our
-        # work for us.
+        q_coeffs = np.asarray(q_coeffs)
+        lead_shape = q_coeffs.shape[:-1]
+        q_coeffs = q_coeffs.reshape(-1,q_coeffs.shape[-1])
+        n_rows = q_coeffs.shape[0]
+        n_raw_terms = len(self.w2_pairs)
         n_unique_terms = len(self.quartic_unique_factors)
-        n_terms = quartic_coeffs.shape[1]
-        n_rows = quartic_coeffs.shape[0]
-        row_ind = np.repeat(np.arange(n_rows),n_terms)
-        col_ind = np.tile(self.quartic_bins,n_rows)
-        bins = np.ravel_multi_index((row_ind,col_ind,),(n_rows,n_unique_terms))
-        # With these bins defined, we can sum the independent coefficients in each row with np.bincount
-        quartic_coeffs_unique = np.bincount(bins,weights=quartic_coeffs.flatten(),
-                                           minlength=n_rows*n_unique_terms).reshape(n_rows,n_unique_terms)
-        return quartic_coeffs_unique
+        quartic_coeffs_unique = np.empty((n_rows,n_unique_terms))
+
+        # We go through the rows in blocks, so that the temporary
+        # arrays don't scale with the number of rows (i.e. events).  For
+        # each block, we first square the quadratic for calculating the
+        # weight value.  Note: this results in multiple terms that would
+        # be multipled by the same powers of different Wilson
+        # coefficients, so we then use the sparse quartic_map to collect
+        # those terms together (and to apply the factor of two for the
+        # off-diagonal terms).  Per row, we need the raw product and one
+        # of its factors, plus the result of the sparse product.
+        if max_block_bytes is None: max_block_bytes = self.w2_block_bytes
+        row_bytes = 8*(2*n_raw_terms+n_unique_terms)
+        block_rows = max(1,int(max_block_bytes//row_bytes))
+        for start in range(0,n_rows,block_rows):
+            q = q_coeffs[start:start+block_rows]
+            raw = np.take(q,self.w2_pairs[:,0],axis=1).astype(float,copy=False)
+            raw *= q[:,self.w2_pairs[:,1]]
+            quartic_coeffs_unique[start:start+block_rows] = (self.quartic_map @ raw.T).T
+        return quartic_coeffs_unique.reshape(*lead_shape,n_unique_terms)
+
+    def calc_gram(self,q_coeffs,gram=None):
+        """Accumulate the Gram matrix q_coeffs.T @ q_coeffs of a set of rows of quadratic coefficients.
+
+        Args:
+            q_coeffs: A 2D array (rows, e.g. events times their weight, by coefficients).
+            gram: Optional (ncoeffs, ncoeffs) float64 array to add the result to.
+
+        Returns:
+            The Gram matrix.  Only its lower triangle is filled (it is symmetric), which is all
+            that fold_gram() needs.  The product is done with the BLAS syrk routine.
+        """
+        n = self.get_w_coeffs()
+        if gram is None: gram = np.zeros((n,n),order='F')
+        q = np.asarray(q_coeffs,dtype=np.float64)
+        if len(q) == 0: return gram
+        # A C-ordered (rows, n) array is the Fortran-ordered (n, rows) array q.T, so asking
+        # syrk for a @ a.T with a=q.T gives q.T @ q without copying q.
+        return scipy.linalg.blas.dsyrk(1.0,q.T,beta=1.0,c=gram,trans=0,lower=1,overwrite_c=1)
+
+    def fold_gram(self,gram):
+        """Convert Gram matrices of quadratic coefficients into unique quartic coefficients.
+
+        Summing the result of calc_w2_coeffs() over a set of rows gives the same as folding
+        the Gram matrix of those rows: each raw quartic term is the product of two quadratic
+        coefficients, i.e. one entry in the lower triangle of the matrix.
+
+        Args:
+            gram: Array of shape (..., ncoeffs, ncoeffs), only the lower triangle is used.
+
+        Returns:
+            An array of shape (..., n_w2_coeffs) with the unique quartic coefficients.
+        """
+        raw = gram[...,self.w2_pairs[:,0],self.w2_pairs[:,1]]
+        lead_shape = raw.shape[:-1]
+        raw = raw.reshape(-1,raw.shape[-1])
+        return (self.quartic_map @ raw.T).T.reshape(*lead_shape,self.get_w2_coeffs())
 
     def calc_eft_w2(self,quartic_coeffs_unique,wc_values):
         """Calculate the w**2 values for a specific set of WC values.
@@ -162,21 +317,213 @@ class EFTHelper:
         Returns:
             An array of the w**2 values calculated from the quartic parameterization.
         """
-        # Prepend "1" to the start of the WC array to account for constant and linear terms
-        wcs = np.hstack((np.array([1]),wc_values))
-        # multiply the WC values by the quadratic coefficiencts and sum to get the weights.
-        return np.sum(quartic_coeffs_unique*
-                      wcs[self.quartic_unique_factors[:,0]]*
-                      wcs[self.quartic_unique_factors[:,1]]*
-                      wcs[self.quartic_unique_factors[:,2]]*
-                      wcs[self.quartic_unique_factors[:,3]],
-                      axis=-1)
-        
-        
+        # Same as for the weights, but with the monomials of the quartic function
+        return np.tensordot(quartic_coeffs_unique,self.get_monomials(wc_values,'w2'),axes=([-1],[0]))
+
+    def get_w_monomials(self,wc_points):
+        """Calculate the monomials of the WCs that multiply each quadratic coefficient.
+
+        Args:
+            wc_points: A 1D array with one set of WC values, or a 2D array of shape (npoints, nwc)
+                       with one set of WC values per row.
+
+        Returns:
+            An array of shape (npoints, ncoeffs) such that the weights at all the points are
+            given by q_coeffs @ monomials.T (the first dimension is dropped for 1D input).
+        """
+        pts = np.atleast_1d(np.asarray(wc_points,dtype=float))
+        wcs = np.concatenate((np.ones((*pts.shape[:-1],1)),pts),axis=-1)
+        return wcs[...,self.quadratic_pairs[:,0]]*wcs[...,self.quadratic_pairs[:,1]]
+
+    def get_w2_monomials(self,wc_points):
+        """Calculate the monomials of the WCs that multiply each unique quartic coefficient.
+
+        Args:
+            wc_points: A 1D array with one set of WC values, or a 2D array of shape (npoints, nwc).
+
+        Returns:
+            An array of shape (npoints, nw2coeffs), the w**2 analogue of get_w_monomials().
+        """
+        pts = np.atleast_1d(np.asarray(wc_points,dtype=float))
+        wcs = np.concatenate((np.ones((*pts.shape[:-1],1)),pts),axis=-1)
+        return (wcs[...,self.quartic_unique_factors[:,0]]*
+                wcs[...,self.quartic_unique_factors[:,1]]*
+                wcs[...,self.quartic_unique_factors[:,2]]*
+                wcs[...,self.quartic_unique_factors[:,3]])
+
+    def calc_eft_weights_at(self,q_coeffs,wc_points):
+        """Calculate the weights at many sets of WC values at once.
+
+        Args:
+            q_coeffs: Array of quadratic coefficients, as for calc_eft_weights().
+            wc_points: A 2D array of shape (npoints, nwc).
+
+        Returns:
+            An array of shape (*q_coeffs.shape[:-1], npoints), computed as a single matrix product.
+        """
+        return q_coeffs @ self.get_w_monomials(np.atleast_2d(wc_points)).T
+
+    def calc_eft_w2_at(self,quartic_coeffs_unique,wc_points):
+        """Calculate the w**2 values at many sets of WC values at once.
+
+        Args:
+            quartic_coeffs_unique: Array of unique quartic coefficients, as for calc_eft_w2().
+            wc_points: A 2D array of shape (npoints, nwc).
+
+        Returns:
+            An array of shape (*quartic_coeffs_unique.shape[:-1], npoints).
+        """
+        return quartic_coeffs_unique @ self.get_w2_monomials(np.atleast_2d(wc_points)).T
+
+    def get_quadratic_form(self,q_coeffs):
+        """Express the quadratic coefficients as symmetric matrices.
+
+        Args:
+            q_coeffs: Array of quadratic coefficients, the last dimension should specify the coefficients.
+
+        Returns:
+            An array of shape (*q_coeffs.shape[:-1], nwc+1, nwc+1) with, for each set of coefficients, the
+            symmetric matrix A such that the weight is x @ A @ x, where x = [1]+wc_values.
+        """
+        q_coeffs = np.asarray(q_coeffs)
+        nx = self.quadratic_pairs[-1,0]+1
+        i, j = self.quadratic_pairs[:,0], self.quadratic_pairs[:,1]
+        # The off-diagonal terms are split between the two halves of the matrix
+        half = np.where(i==j,1.0,0.5)
+        form = np.zeros((*q_coeffs.shape[:-1],nx,nx),dtype=np.result_type(q_coeffs.dtype,float))
+        form[...,i,j] = q_coeffs*half
+        form[...,j,i] = q_coeffs*half
+        return form
+
+    def get_gradient_monomials(self,wc_values):
+        """Calculate the derivatives of the monomials of get_w_monomials() with respect to each WC.
+
+        Args:
+            wc_values: A 1D array specifying the Wilson coefficients.
+
+        Returns:
+            An array of shape (ncoeffs, nwc), such that q_coeffs @ monomials gives the gradient of the weights.
+        """
+        wcs = np.concatenate(([1.0],np.asarray(wc_values,dtype=float)))
+        i, j = self.quadratic_pairs[:,0], self.quadratic_pairs[:,1]
+        monomials = np.zeros((len(self.quadratic_pairs),len(wcs)-1))
+        # d(x_i*x_j)/dc_k = delta_(i,k+1)*x_j + delta_(j,k+1)*x_i, the SM term x_0 = 1 is not a WC
+        rows = np.arange(len(self.quadratic_pairs))
+        np.add.at(monomials,(rows[i>0],i[i>0]-1),wcs[j[i>0]])
+        np.add.at(monomials,(rows[j>0],j[j>0]-1),wcs[i[j>0]])
+        return monomials
+
+    def get_hessian_monomials(self):
+        """Calculate the second derivatives of the monomials of get_w_monomials() with respect to the WCs.
+
+        Since the weights are quadratic functions of the WCs, these don't depend on the WC values.
+
+        Returns:
+            An array of shape (ncoeffs, nwc, nwc), such that the Hessian of the weights is given by
+            np.tensordot(q_coeffs, monomials, axes=([-1],[0])).
+        """
+        i, j = self.quadratic_pairs[:,0], self.quadratic_pairs[:,1]
+        nwc = self.quadratic_pairs[-1,0]
+        monomials = np.zeros((len(self.quadratic_pairs),nwc,nwc))
+        quad = (i>0)&(j>0)
+        rows = np.arange(len(self.quadratic_pairs))[quad]
+        np.add.at(monomials,(rows,i[quad]-1,j[quad]-1),1.0)
+        np.add.at(monomials,(rows,j[quad]-1,i[quad]-1),1.0)
+        return monomials
+
+    def calc_eft_gradient(self,q_coeffs,wc_values):
+        """Calculate the gradient of the weights with respect to the WCs.
+
+        Args:
+            q_coeffs: Array of quadratic coefficients, as for calc_eft_weights().
+            wc_values: A 1D array specifying the Wilson coefficients where the gradient is evaluated.
+
+        Returns:
+            An array of shape (*q_coeffs.shape[:-1], nwc).
+        """
+        return np.tensordot(q_coeffs,self.get_gradient_monomials(wc_values),axes=([-1],[0]))
+
+    def calc_eft_hessian(self,q_coeffs):
+        """Calculate the Hessian matrix of the weights with respect to the WCs (the same for all the WC values).
+
+        Args:
+            q_coeffs: Array of quadratic coefficients, as for calc_eft_weights().
+
+        Returns:
+            An array of shape (*q_coeffs.shape[:-1], nwc, nwc).
+        """
+        return np.tensordot(q_coeffs,self.get_hessian_monomials(),axes=([-1],[0]))
+
+    def get_active_wcs(self,q_coeffs):
+        """Find the WCs that the weights actually depend on.
+
+        Args:
+            q_coeffs: Array of quadratic coefficients, the last dimension should specify the coefficients.
+
+        Returns:
+            A 1D array with the (sorted) indices of the WCs that have at least one non-zero linear or
+            quadratic term.  The others could be set to anything without changing any of the weights.
+        """
+        q_coeffs = np.asarray(q_coeffs)
+        nonzero = np.any(q_coeffs.reshape(-1,q_coeffs.shape[-1]) != 0,axis=0)
+        # The last quadratic pair is (nwc, nwc), and index 0 of the [1]+wc_values array is the SM term
+        active = np.zeros(self.quadratic_pairs[-1,0]+1,dtype=bool)
+        active[self.quadratic_pairs[nonzero].ravel()] = True
+        return np.flatnonzero(active[1:])
+
+    def get_sub_indices(self,active_wcs):
+        """Find where the coefficients of a subset of the WCs sit among the coefficients of all of them.
+
+        The coefficients of EFTHelper([wc_names[i] for i in active_wcs]) are the coefficients of this
+        helper that only involve those WCs, in the same order.  So the terms of a weight that does not
+        depend on the other WCs can be stored and evaluated with the smaller helper.
+
+        Args:
+            active_wcs: A sorted 1D array with the indices of the WCs in the subset.
+
+        Returns:
+            A tuple (w_indices, w2_indices) with, for each quadratic (resp. unique quartic) coefficient
+            of the subset, its index among the coefficients of this helper.
+        """
+        # Indices of the subset in the [1]+wc_values array, including the SM term
+        factors = np.concatenate(([0],np.asarray(active_wcs,dtype=int)+1))
+        w_indices = np.flatnonzero(np.all(np.isin(self.quadratic_pairs,factors),axis=1))
+        w2_indices = np.flatnonzero(np.all(np.isin(self.quartic_unique_factors,factors),axis=1))
+        return w_indices,w2_indices
+
+    def get_full_indices(self):
+        """Find where the coefficients of this helper sit among the quadratic coefficients of a regular helper.
+
+        Returns:
+            A 1D array with, for each coefficient, its index in the full quadratic coefficients (e.g. in the
+            EFTfitCoefficients of the events).  All of them, unless the helper is linear.
+        """
+        i, j = self.quadratic_pairs[:,0], self.quadratic_pairs[:,1]
+        return i*(i+1)//2+j
+
     def get_w_coeffs(self):
         """Return the number of EFT weight coefficients"""
         return self.quadratic_pairs.shape[0]
 
     def get_w2_coeffs(self):
         """Return the number of EFT w**2 coefficients"""
-        return self.quartic_unique_factors.shape[0]
+        # One per product of 4 entries of [1]+wc_values (with repetitions), known without building the tables
+        nx = self.quadratic_pairs[-1,0]+1
+        if self._linear: return nx*(nx+1)//2 # w**2 is quadratic
+        return nx*(nx+1)*(nx+2)*(nx+3)//24
+
+    def __getstate__(self):
+        # The lock can't be pickled, and the tables and cache can be rebuilt
+        state = self.__dict__.copy()
+        for key in ('_lock','_monomial_cache','_quartic_tables'): state.pop(key,None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._monomial_cache = OrderedDict()
+        self._quartic_tables = None
+        # Older pickles have the tables as plain attributes
+        for key in ('w2_pairs','quartic_unique_factors','quartic_bins','quartic_map'): self.__dict__.pop(key,None)
+        if not hasattr(self,'_cache_size'): self._cache_size = 8
+        if not hasattr(self,'_linear'): self._linear = False
@@ -17,35 +17,139 @@ import numpy as np
 import copy
 import awkward as ak
 import numbers
+import weakref
+from collections import OrderedDict
 
-from coffea.hist.hist_tools import DenseAxis
+from coffea.hist.hist_tools import DenseAxis, Bin
 
 from topcoffea.modules.EFTHelper import EFTHelper
+from topcoffea.modules.CoeffBlock import CoeffBlock
 
 class HistEFT(coffea.hist.Hist):
 
+  # Class level defaults, so that histograms pickled before these options existed still load
+  _contiguous = False
+  _eft_errors = False
+  _sumw_comp = None
+  _sumw2_comp = None
+  _compact = False
+  _active = None
+  _subspaces = None
+  _values_cache = None
+  _values_cache_size = 0
+  _share_group = None
+  _scratch = None
+  _linear = False
+
   def __init__(self, label, wcnames, *axes, **kwargs):
-    """ Initialize """
+    """ Initialize
+        contiguous: if True, the EFT coefficients of all the sparse bins are stored in a single
+                    (nsparse, *dense_shape, ncoeffs) array (see CoeffBlock) instead of one array per sparse bin
+        eft_errors: if True, fill() works out the w**2 coefficients of each bin itself (from the Gram
+                    matrix of the EFT coefficients of the events in the bin), so eft_err_coeff is not needed
+        dtype:      numpy dtype used to store the sums (and EFT coefficients), as in coffea.hist.Hist.
+                    With a single precision dtype (e.g. np.float32) the stored histograms take half the
+                    memory, while fill() still sums the events of each call in double precision and add()
+                    keeps a compensation term (Kahan-Neumaier summation) for the rounding errors of the sums
+        compact:    if True, each EFT bin only stores the coefficients of the WCs its events depend on (the
+                    "active" WCs, see EFTHelper.get_active_wcs()), which is much smaller for samples that are
+                    only sensitive to a few WCs.  The bins are moved to a larger set of WCs as needed when
+                    filling or combining them, and values() evaluates each bin with its own set of WCs
+        values_cache: number of values() results (one per WC point, overflow and sumw2 flag) kept in a LRU
+                    cache, so that asking again for the same WC point does not evaluate all the bins again.
+                    The cache is emptied by fill(), add(), scale() and clear().  Disabled (0) by default
+        scratch:    directory where the EFT coefficients are kept in memory-mapped files instead of in memory
+                    (implies contiguous), for histograms larger than the memory.  add(), sum(), values()...
+                    then stream over the coefficient rows, a chunk at a time.  Unpickled histograms are in memory
+        linear:     if True, only the SM and linear (interference) terms are kept: 1+nwc coefficients per bin
+                    instead of (1+nwc)*(2+nwc)/2.  fill() takes the usual quadratic coefficients of the events
+                    and drops the quadratic terms; the w**2 coefficients are always worked out from the linear
+                    ones (as with eft_errors), since the given eft_err_coeff include the quadratic terms
+    """
     if isinstance(wcnames, str) and ',' in wcnames: wcnames = wcnames.replace(' ', '').split(',')
     n = len(wcnames) if isinstance(wcnames, list) else wcnames
     self._wcnames = wcnames
-    self._eft_helper = EFTHelper(wcnames)
+    self._linear = kwargs.pop('linear', False)
+    self._eft_helper = EFTHelper.shared(wcnames, linear=self._linear)
     self._nwc = n
     self._ncoeffs = self._eft_helper.get_w_coeffs()
     self._nerrcoeffs = self._eft_helper.get_w2_coeffs()
     self._wcs = np.zeros(n)
+    self._scratch = kwargs.pop('scratch', None)
+    self._contiguous = kwargs.pop('contiguous', False) or self._scratch is not None
+    self._eft_errors = kwargs.pop('eft_errors', False)
+    self._compact = kwargs.pop('compact', False)
+    self._active = {} # sparse key -> tuple with the indices of the active WCs, for the compact EFT bins
+    self._values_cache_size = kwargs.pop('values_cache', 0)
+    self._values_cache = OrderedDict() # (WC point, overflow, sumw2) -> output of values()
     
     super().__init__(label, *axes, **kwargs)
+    self._sumw = self._new_storage(self._ncoeffs)
+
+  def _new_storage(self, ncoeffs):
+    """ Empty container for the {sparse key: array} contents of the histogram """
+    if self._contiguous:
+      return CoeffBlock((*self._dense_shape, ncoeffs), dtype=self._dtype, directory=self._scratch)
+    return {}
+
+  def _new(self, *axes):
+    """ Empty HistEFT with the same WCs, storage options and WC point as this one, but with the given axes """
+    out = HistEFT(self._label, self._wcnames, *axes, dtype=self._dtype, contiguous=self._contiguous, eft_errors=self._eft_errors, compact=self._compact, values_cache=self._values_cache_size, scratch=self._scratch, linear=self._linear)
+    out._wcs = copy.deepcopy(self._wcs)
+    return out
+
+  def _is_eft_bin(self, key):
+    """ Whether the sparse bin key holds EFT coefficients (i.e. has one more dimension than the dense axes) """
+    return np.ndim(self._sumw[key]) > self.dense_dim()
 
+  def _active_of(self, key):
+    """ Active WCs of a compact EFT bin (a tuple of WC indices), or None if the bin has all the WCs """
+    return self._active.get(key) if self._active else None
+
+  def _find_active(self, eft_coeff):
+    """ Active WCs of a set of events, in the same format as _active_of() """
+    active = tuple(int(i) for i in self._eft_helper.get_active_wcs(eft_coeff))
+    return None if len(active) == self._nwc else active
+
+  def _union_active(self, a, b):
+    if a is None or b is None: return None
+    active = tuple(sorted(set(a) | set(b)))
+    return None if len(active) == self._nwc else active
+
+  def _subspace(self, active):
+    """ EFTHelper for a set of active WCs, and the indices of its w and w**2 coefficients among the full ones """
+    if active is None:
+      return self._eft_helper, np.arange(self._ncoeffs), np.arange(self._nerrcoeffs)
+    if self._subspaces is None: self._subspaces = {}
+    if active not in self._subspaces:
+      helper = EFTHelper.shared([self._wcnames[i] for i in active], linear=self._linear)
+      self._subspaces[active] = (helper, *self._eft_helper.get_sub_indices(active))
+    return self._subspaces[active]
+
+  def _embed(self, array, active_from, active_to, err=False):
+    """ Express the coefficients of a bin with the WCs active_from with the (larger) set of WCs active_to """
+    if array is None or active_from == active_to: return array
+    _, w_from, w2_from = self._subspace(active_from)
+    _, w_to, w2_to = self._subspace(active_to)
+    idx_from, idx_to = (w2_from, w2_to) if err else (w_from, w_to)
+    out = np.zeros((*array.shape[:-1], len(idx_to)), dtype=array.dtype)
+    out[..., np.searchsorted(idx_to, idx_from)] = array
+    return out
+
+  def _change_active(self, key, active):
+    """ Move the EFT bin key (and its errors and compensation terms) to a larger set of active WCs """
+    current = self._active_of(key)
+    for storage, err in ((self._sumw, False), (self._sumw2, True), (self._sumw_comp, False), (self._sumw2_comp, True)):
+      if storage is not None and key in storage and storage[key] is not None:
+        storage[key] = self._embed(storage[key], current, active, err)
+    if active is None: self._active.pop(key, None)
+    else: self._active[key] = active
 
   def _init_sumw2(self):
-    self._sumw2 = {}
+    self._sumw2 = self._new_storage(self._nerrcoeffs)
     for key in self._sumw.keys():
       # Check if this is an EFT bin or a regular bin
-      if self.dense_dim() > 0:
-        is_eft_bin = (self._sumw[key].shape != self._dense_shape)
-      else:
-        is_eft_bin = isinstance(self._sumw[key],np.ndarray)
+      is_eft_bin = self._is_eft_bin(key)
       
       if is_eft_bin:
         # EFT bins that already existed prior to calling sumw2 can't
@@ -58,25 +162,114 @@ class HistEFT(coffea.hist.Hist):
     """Set the WC values used to evaluate the bin contents of this histogram"""
     self._wcs = np.asarray(values).copy()
 
+  def _compensated(self):
+    """ Whether add() keeps a compensation term for the rounding errors of the stored sums """
+    dtype = np.dtype(self._dtype)
+    return dtype.kind == 'f' and dtype.itemsize < 8
+
+  @staticmethod
+  def _two_sum(s, x):
+    """ Neumaier summation step: returns s + x (in the dtype of s) and the rounding error of that sum """
+    xs = np.asarray(x, dtype=s.dtype)
+    t = np.asarray(s + xs)
+    err = np.where(np.abs(s) >= np.abs(xs), (s - t) + xs, (xs - t) + s)
+    if xs is not x:
+      err = err + (x - xs)
+    return t, err
+
+  def _fold_compensation(self):
+    """ Add the compensation terms kept by add() back into the sums, every other operation works on those """
+    for storage, comp in ((self._sumw, self._sumw_comp), (self._sumw2, self._sumw2_comp)):
+      if comp is None: continue
+      for key, c in comp.items():
+        storage[key] += c
+    self._sumw_comp = None
+    self._sumw2_comp = None
+
+  # Attributes that are rebuilt from the WC names after unpickling (the helper and its tables, the number of
+  # coefficients) or that only hold cached results
+  _derived_state = ('_eft_helper', '_nwc', '_ncoeffs', '_nerrcoeffs', '_subspaces', '_values_cache')
+
+  def __getstate__(self):
+    # Don't ship the compensation terms, the sums are what gets transferred
+    self._fold_compensation()
+    state = self.__dict__.copy()
+    for name in self._derived_state: state.pop(name, None)
+    # Nor the bookkeeping that is empty or at its default value (restored from the class attributes).  A view
+    # is unpickled with its own copy of the arrays, so it is not shared anymore
+    for name in ('_sumw_comp', '_sumw2_comp', '_contiguous', '_eft_errors', '_compact', '_values_cache_size', '_linear'):
+      if name in state and state[name] is getattr(HistEFT, name): del state[name]
+    state.pop('_share_group', None)
+    if not state.get('_active', True): del state['_active']
+    if '_wcs' in state and not np.any(state['_wcs']): del state['_wcs']
+    # The coefficients are unpickled in memory (see CoeffBlock), the scratch directory is local to this machine
+    state.pop('_scratch', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._eft_helper = EFTHelper.shared(self._wcnames, linear=self._linear)
+    self._nwc = len(self._wcnames) if isinstance(self._wcnames, list) else self._wcnames
+    self._ncoeffs = self._eft_helper.get_w_coeffs()
+    self._nerrcoeffs = self._eft_helper.get_w2_coeffs()
+    if '_wcs' not in state: self._wcs = np.zeros(self._nwc)
+    if self._active is None: self._active = {}
+
+  def _invalidate_values(self):
+    """ Forget the cached values(), called by everything that modifies the contents of the histogram """
+    if self._values_cache: self._values_cache.clear()
+
+  def _share_with(self, other):
+    """ Record that other uses the arrays of this histogram (see __getitem__) """
+    if self._share_group is None: self._share_group = {id(self): weakref.ref(self)}
+    self._share_group[id(other)] = weakref.ref(other)
+    other._share_group = self._share_group
+
+  def _is_shared(self):
+    """ True if another histogram that is still alive uses the arrays of this one """
+    if self._share_group is None: return False
+    return any(ref() is not None and ref() is not self for ref in self._share_group.values())
+
+  def _leave_share_group(self):
+    if self._share_group is not None: self._share_group.pop(id(self), None)
+    self._share_group = None
+
+  def _unshare(self):
+    """ Copy the arrays shared with another histogram (see __getitem__) before modifying them in-place """
+    self._invalidate_values()
+    if self._share_group is None: return
+    shared = self._is_shared()
+    self._leave_share_group()
+    if shared:
+      self._sumw = copy.deepcopy(self._sumw)
+      self._sumw2 = copy.deepcopy(self._sumw2)
+
   def copy(self, content=True):
     """ Copy """
-    out = HistEFT(self._label, self._wcnames, *self._axes, dtype=self._dtype)
-    if self._sumw2 is not None: out._sumw2 = {}
-    out._wcs = copy.deepcopy(self._wcs)
+    if content: self._fold_compensation()
+    out = self._new(*self._axes)
+    if self._sumw2 is not None: out._init_sumw2()
     if content:
         out._sumw = copy.deepcopy(self._sumw)
         out._sumw2 = copy.deepcopy(self._sumw2)
+        out._active = dict(self._active or {})
     return out
 
   def identity(self):
     return self.copy(content=False)
 
   def clear(self):
-    self._sumw = {}
+    self._invalidate_values()
+    self._leave_share_group()
+    self._sumw = self._new_storage(self._ncoeffs)
     self._sumw2 = None
+    self._sumw_comp = None
+    self._sumw2_comp = None
+    self._active = {}
 
   def fill(self, **values):
     """ Fill histogram, incuding EFT fit coefficients """
+    self._unshare()
 
     # If we're not filling with EFT coefficients, just do the normal coffea.hist.Hist.fill().
     eft_coeff = values.pop("eft_coeff",None)
@@ -113,7 +306,7 @@ class HistEFT(coffea.hist.Hist):
     if eft_coeff is None:
       # But wait.  Does this sparse bin look like it's got EFT coefficients stored in it?
       if sparse_key in self._sumw:
-        if len(np.atleast_1d(self._sumw[sparse_key]).shape) != len(self._dense_shape):
+        if self._is_eft_bin(sparse_key):
           raise ValueError("Attempt to fill an EFT bin with non-EFT events.")
       # Put the weights back in!  We're just going to rely on the
       # regular coffea.hist.Hist fill method to handle this.
@@ -123,28 +316,27 @@ class HistEFT(coffea.hist.Hist):
 
     # OK then, we're doing this with EFT coefficients.    
 
-    # We want this as a numpy array
-    eft_coeff = np.asarray(eft_coeff)
-
-    # Check that we have the right number of coefficients
-    if self._ncoeffs != eft_coeff.shape[1]:
-      raise ValueError(
-        "Wrong number of EFT coefficients.  "+
-        "Expecting {}, received {}".format(self._ncoeffs, eft_coeff.shape[1])
-      )
-    if eft_err_coeff is not None:
-      if self._nerrcoeffs != eft_err_coeff.shape[1]:
-        raise ValueError(
-          "Wrong number of EFT w*w coefficients.  "+
-          "Expecting {}, received {}".format(self._nerrcoeffs, eft_err_coeff.shape[1])
-        )
+    # We want this as a numpy array.  Note: we never modify it (or
+    # eft_err_coeff) in place, the weights are applied while summing.
+    eft_coeff, eft_err_coeff, gram_errors = self._input_coeffs(eft_coeff, eft_err_coeff)
       
-    # Next, if there are weights, we should multiply the EFT coefficients by those weights
-    if weight is not None:
-      eft_coeff *= weight[:,np.newaxis]
-      # Also, if there are EFT error coefficients, those need to be scaled by weight**2
-      if eft_err_coeff is not None:
-        eft_err_coeff *= (weight[:,np.newaxis]**2)
+    # A single number is the weight of every event
+    if weight is not None and len(weight) != len(eft_coeff):
+      weight = np.broadcast_to(weight, (len(eft_coeff),))
+
+    # In compact mode, we only sum the coefficients of the WCs these events depend on, then
+    # put them in the bin with the union of those WCs and the ones it already has
+    active = target = None
+    if self._compact:
+      active = self._find_active(eft_coeff)
+      target = self._union_active(active, self._active_of(sparse_key)) if sparse_key in self._sumw else active
+      if sparse_key in self._sumw and target != self._active_of(sparse_key):
+        self._change_active(sparse_key, target)
+    helper, w_idx, w2_idx = self._subspace(active)
+    if active is not None:
+      eft_coeff = eft_coeff[:, w_idx]
+      if eft_err_coeff is not None: eft_err_coeff = eft_err_coeff[:, w2_idx]
+    target_helper = self._subspace(target)[0]
 
     # At this point, we're ready to accumulate these coefficients with
     # any of our previous ones.  Note: we're going to use the same
@@ -156,98 +348,413 @@ class HistEFT(coffea.hist.Hist):
     # axes, then this just becomes 1D numpy array to store the
     # coefficients for this sparse bin (see below when we go to fill).
     if sparse_key not in self._sumw:
-      self._sumw[sparse_key] = np.zeros(
-        shape=(*self._dense_shape,self._ncoeffs), dtype=self._dtype
-      )
-      if eft_err_coeff is not None:
+      self._zero_bin(self._sumw, sparse_key, target_helper.get_w_coeffs())
+      if eft_err_coeff is not None or gram_errors:
         if self._sumw2 is None:
           self._init_sumw2()
-        self._sumw2[sparse_key] = np.zeros(
-          shape=(*self._dense_shape,self._nerrcoeffs), dtype=self._dtype
-        )
+        self._zero_bin(self._sumw2, sparse_key, target_helper.get_w2_coeffs())
       else:
         if self._sumw2 is not None:
           self._sumw2[sparse_key] = None
+      if target is not None: self._active[sparse_key] = target
 
-    # This get a little weird now.  We want to use np.bincount to sum
-    # up the coefficients in our bins, but this only works for a 1D
-    # array.  So, we're going to construct flat arrays of which
-    # coefficients need to be incremented and then use np.bincount to
-    # do the actual summing.
+    # Find the flat dense bin of each event, then sum the (weighted)
+    # coefficients of the events in each bin.  If there are no dense
+    # axes, all the events go in the one and only "bin".
+    ndense = int(np.prod(self._dense_shape))
     if self.dense_dim() > 0: 
-      # repeat the dense indices ncoeffs times to account for the fact
-      # that we're filling that many numbers
-      dense_indices = tuple(
-        np.repeat(d.index(values[d.name]),self._ncoeffs) for d in self._axes if isinstance(d, DenseAxis)
-      )
-      # This will make sure that all the coefficients in the flattened
-      # array corresponding to the appropriate dense bin get filled
-      xy = np.atleast_1d(
-        np.ravel_multi_index(
-          (*dense_indices,np.tile(np.arange(self._ncoeffs),eft_coeff.shape[0])),
-          (*self._dense_shape,self._ncoeffs))
+      dense_indices = tuple(d.index(values[d.name]) for d in self._axes if isinstance(d, DenseAxis))
+      xy = np.atleast_1d(np.ravel_multi_index(dense_indices, self._dense_shape))
+    else:
+      xy = np.zeros(len(eft_coeff), dtype=np.intp)
+    sumw = self._scatter_coeffs(xy, ndense, eft_coeff, weight).reshape((*self._dense_shape,helper.get_w_coeffs()))
+    self._sumw[sparse_key] += self._embed(sumw, active, target)
+    # Ah, but what about those darned w**2 coefficients?  Those need to be scaled by weight**2
+    if eft_err_coeff is not None:
+      sumw2 = self._scatter_coeffs(
+        xy, ndense, eft_err_coeff, (weight**2 if weight is not None else None)
+      ).reshape((*self._dense_shape,helper.get_w2_coeffs()))
+      self._sumw2[sparse_key] += self._embed(sumw2, active, target, err=True)
+    elif gram_errors:
+      sumw2 = self._scatter_gram(xy, ndense, eft_coeff, weight, helper=helper).reshape((*self._dense_shape,helper.get_w2_coeffs()))
+      self._sumw2[sparse_key] += self._embed(sumw2, active, target, err=True)
+
+  def _input_coeffs(self, eft_coeff, eft_err_coeff):
+    """ Check the EFT coefficients of the events given to fill(), returns (eft_coeff, eft_err_coeff, gram_errors)
+        gram_errors tells if the w**2 coefficients are to be worked out from eft_coeff (see the eft_errors option)
+    """
+    eft_coeff = np.asarray(eft_coeff)
+    # In eft_errors mode we work out the w**2 coefficients ourselves
+    gram_errors = self._eft_errors and eft_err_coeff is None
+    if self._linear:
+      # Keep the SM and linear terms of the full quadratic coefficients.  The w**2 ones can't be sliced the same
+      # way (the squares of the linear terms mix with the products of the SM and quadratic terms), so they are
+      # always worked out from the linear terms
+      if eft_coeff.shape[1] == (self._nwc+1)*(self._nwc+2)//2:
+        eft_coeff = eft_coeff[:, self._eft_helper.get_full_indices()]
+      gram_errors = self._eft_errors or eft_err_coeff is not None
+      eft_err_coeff = None
+    # Check that we have the right number of coefficients
+    if self._ncoeffs != eft_coeff.shape[1]:
+      raise ValueError(
+        "Wrong number of EFT coefficients.  "+
+        "Expecting {}, received {}".format(self._ncoeffs, eft_coeff.shape[1])
       )
-      # This little bit of magic sums the coefficients into the right
-      # bins.  It's just like filling a regular histogram bin, except
-      # that we're doing it _ncoeffs times.
-      self._sumw[sparse_key] += np.bincount(
-        xy, weights=eft_coeff.flatten(),
-        minlength=np.array((*self._dense_shape,self._ncoeffs)).prod()
-      ).reshape((*self._dense_shape,self._ncoeffs))
-      # Ah, but what about those darned w**2 coefficients?
-      if eft_err_coeff is not None:
-        # We're doing the same thing as for the EFT weight coefficients, but with the err array
-        dense_indices = tuple(
-          np.repeat(d.index(values[d.name]),self._nerrcoeffs) for d in self._axes if isinstance(d, DenseAxis)
-        )
-        xy = np.atleast_1d(
-          np.ravel_multi_index(
-            (*dense_indices,np.tile(np.arange(self._nerrcoeffs),eft_err_coeff.shape[0])),
-          (*self._dense_shape,self._nerrcoeffs))
+    if eft_err_coeff is not None:
+      eft_err_coeff = np.asarray(eft_err_coeff)
+      if self._nerrcoeffs != eft_err_coeff.shape[1]:
+        raise ValueError(
+          "Wrong number of EFT w*w coefficients.  "+
+          "Expecting {}, received {}".format(self._nerrcoeffs, eft_err_coeff.shape[1])
         )
-        self._sumw2[sparse_key] += np.bincount(
-          xy, weights=eft_err_coeff.flatten(),
-          minlength=np.array((*self._dense_shape,self._nerrcoeffs)).prod()
-        ).reshape((*self._dense_shape,self._nerrcoeffs))
+    return eft_coeff, eft_err_coeff, gram_errors
+
+  def _zero_bin(self, storage, key, ncols):
+    """ Set storage[key] to zeros of shape (*dense_shape, ncols) """
+    if isinstance(storage, CoeffBlock) and storage.row_shape == (*self._dense_shape, ncols):
+      storage.alloc(key)
     else:
-      # If we end up here, then the sparse bin has no dense bins.
-      # That means all our eft_coeff and eft_err_coeffs just need to
-      # be summed and stored in this bin directly
-      self._sumw[sparse_key] += np.sum(eft_coeff,axis=0)
-      if eft_err_coeff is not None:
-        self._sumw2[sparse_key] += np.sum(eft_err_coeff,axis=0)
+      storage[key] = np.zeros(shape=(*self._dense_shape,ncols), dtype=self._dtype)
+
+  # Number of coefficient values summed at once by _scatter_coeffs(), this bounds its temporary memory
+  _scatter_block_size = 2**20
+
+  def _scatter_coeffs(self, bins, nbins, coeffs, weight=None, rows=None):
+    """ Sum rows of coeffs into nbins flat bins, returns a (nbins, ncols) float64 array
+        bins: the flat bin of each entry
+        coeffs: (nrows, ncols) array of coefficients (not modified)
+        weight: optional weight of each entry
+        rows: the row of coeffs used by each entry (by default, entry i uses row i)
+    """
+    ncols = coeffs.shape[1]
+    out = np.zeros((nbins, ncols))
+    bins = np.asarray(bins)
+    if len(bins) == 0: return out
+
+    # Sort the entries by bin once, then go through them in blocks of
+    # at most _scatter_block_size values.  Each block is gathered into
+    # the same buffers and summed bin by bin with np.add.reduceat, so
+    # we never build index arrays of size nentries*ncols or copies of
+    # the full coefficient array.
+    order = np.argsort(bins, kind='stable')
+    step = max(1, self._scatter_block_size // ncols)
+    gathered = np.empty((min(step, len(bins)), ncols), dtype=coeffs.dtype)
+    scaled = np.empty((min(step, len(bins)), ncols)) if weight is not None else None
+    for start in range(0, len(bins), step):
+      idx = order[start:start+step]
+      block_bins = bins[idx]
+      block = np.take(coeffs, idx if rows is None else rows[idx], axis=0, out=gathered[:len(idx)])
+      if weight is not None:
+        block = np.multiply(block, weight[idx,np.newaxis], out=scaled[:len(idx)])
+      starts = np.flatnonzero(np.r_[True, block_bins[1:] != block_bins[:-1]])
+      out[block_bins[starts]] += np.add.reduceat(block, starts, axis=0, dtype=np.float64)
+    return out
 
-  def add(self, other):
-    """ Add another histogram into this one, in-place """
+  def _scatter_gram(self, bins, nbins, coeffs, weight=None, rows=None, helper=None):
+    """ Work out the w**2 coefficients of nbins flat bins, returns a (nbins, nerrcoeffs) array
+        Takes the same arguments as _scatter_coeffs(), with the quadratic coefficients of the entries,
+        plus the EFTHelper for those coefficients (by default the one of the histogram).
+        For each bin, the Gram matrix (sum of the outer products of the weighted coefficients of its
+        entries) is accumulated with BLAS and folded into the unique quartic terms, which gives the
+        same as summing the per-entry quartic coefficients without ever building them.
+    """
+    if helper is None: helper = self._eft_helper
+    ncols = coeffs.shape[1]
+    out = np.zeros((nbins, helper.get_w2_coeffs()))
+    bins = np.asarray(bins)
+    if len(bins) == 0: return out
+    order = np.argsort(bins, kind='stable')
+    sorted_bins = bins[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    ends = np.r_[starts[1:], len(bins)]
+    step = max(1, self._scatter_block_size // ncols)
+    gram = np.zeros((ncols, ncols), order='F')
+    for start, end in zip(starts, ends):
+      gram[...] = 0
+      for block_start in range(start, end, step):
+        idx = order[block_start:min(block_start+step, end)]
+        block = np.take(coeffs, idx if rows is None else rows[idx], axis=0).astype(np.float64, copy=False)
+        if weight is not None:
+          block *= weight[idx,np.newaxis]
+        gram = helper.calc_gram(block, gram)
+      out[sorted_bins[start]] = helper.fold_gram(gram)
+    return out
+
+  def fill_categories(self, categories, selection, **values):
+    """ Fill several sparse bins (categories) with the same events in a single pass
+    Parameters
+    ----------
+      categories : list
+             One entry per category, each a dict {sparse axis name: identifier}
+      selection : array
+             Either an integer array with the index in categories of each event (negative to skip the event),
+             or a boolean array of shape (nevents, ncategories) telling which categories each event goes in
+      ``**values``
+             The dense axes values of the events, plus the optional ``weight``, ``eft_coeff`` and ``eft_err_coeff``
+             as in `fill`. With a boolean selection, ``weight`` can also have shape (nevents, ncategories)
+             to use a different weight for each category.
+    Examples
+    --------
+    >>> h.fill_categories([{'sample':'ttH', 'channel':'2lss'}, {'sample':'ttH', 'channel':'3l'}],
+    ...                   np.stack([mask_2lss, mask_3l], axis=1), met=met, weight=weight, eft_coeff=eft_coeffs)
+    """
+    self._unshare()
+    eft_coeff = values.pop("eft_coeff",None)
+    eft_err_coeff = values.pop("eft_err_coeff",None)
+    weight = values.pop("weight", None)
+    if isinstance(weight, (ak.Array, np.ndarray)):
+      weight = np.asarray(weight)
+    if isinstance(weight, numbers.Number):
+      weight = np.atleast_1d(weight)
+
+    dense_names = [d.name for d in self.dense_axes()]
+    sparse_names = [d.name for d in self.sparse_axes()]
+    if not all(name in values for name in dense_names):
+      missing = ", ".join(name for name in dense_names if name not in values)
+      raise ValueError("Not all dense axes specified for %r.  Missing: %s" % (self, missing))
+    if not all(name in dense_names for name in values):
+      extra = ", ".join(name for name in values if name not in dense_names)
+      raise ValueError("Unrecognized dense axes specified for %r.  Extraneous: %s" % (self, extra))
+    for cat in categories:
+      if set(cat.keys()) != set(sparse_names):
+        raise ValueError("Categories must give an identifier for each sparse axis of %r (%s)" % (self, ", ".join(sparse_names)))
+    sparse_keys = [tuple(d.index(cat[d.name]) for d in self.sparse_axes()) for cat in categories]
+    ncats = len(sparse_keys)
+
+    # Turn the selection into a list of (event, category) entries
+    selection = np.asarray(selection)
+    if selection.dtype == bool:
+      if selection.ndim != 2 or selection.shape[1] != ncats:
+        raise ValueError("Boolean selection must have shape (nevents, %d)" % ncats)
+      events, cats = np.nonzero(selection)
+    else:
+      if selection.size and selection.max() >= ncats:
+        raise ValueError("Category index %d out of range for %d categories" % (selection.max(), ncats))
+      events = np.flatnonzero(selection >= 0)
+      cats = selection[events]
+    if weight is not None:
+      if weight.ndim == 2:
+        if selection.dtype != bool:
+          raise ValueError("Per-category weights require a boolean selection")
+        if weight.shape != selection.shape:
+          raise ValueError("Per-category weights must have the shape of the selection %r, received %r" % (selection.shape, weight.shape))
+        weight = weight[events, cats]
+      elif len(weight) == 1:
+        weight = np.broadcast_to(weight, events.shape)
+      else:
+        weight = weight[events]
+
+    # Flat index of each entry: (category, dense bin)
+    ndense = int(np.prod(self._dense_shape))
+    if self.dense_dim() > 0:
+      dense_indices = tuple(d.index(values[d.name]) for d in self.dense_axes())
+      xy = np.atleast_1d(np.ravel_multi_index(dense_indices, self._dense_shape))[events]
+    else:
+      xy = np.zeros(len(events), dtype=np.intp)
+    bins = cats*ndense + xy
+
+    if eft_coeff is None:
+      # Regular bins, same as coffea.hist.Hist.fill()
+      for key in sparse_keys:
+        if key in self._sumw and self._is_eft_bin(key):
+          raise ValueError("Attempt to fill an EFT bin with non-EFT events.")
+      if weight is not None and self._sumw2 is None:
+        self._init_sumw2()
+      sumw = np.bincount(bins, weights=weight, minlength=ncats*ndense).reshape(ncats, *self._dense_shape)
+      if self._sumw2 is not None:
+        sumw2 = np.bincount(bins, weights=(weight**2 if weight is not None else None), minlength=ncats*ndense).reshape(ncats, *self._dense_shape)
+      for i, key in enumerate(sparse_keys):
+        if key not in self._sumw:
+          self._sumw[key] = np.zeros(shape=self._dense_shape, dtype=self._dtype)
+          if self._sumw2 is not None:
+            self._sumw2[key] = np.zeros(shape=self._dense_shape, dtype=self._dtype)
+        self._sumw[key] += sumw[i]
+        if self._sumw2 is not None:
+          self._sumw2[key] += sumw2[i]
+      return
+
+    eft_coeff, eft_err_coeff, gram_errors = self._input_coeffs(eft_coeff, eft_err_coeff)
+    with_errors = eft_err_coeff is not None or gram_errors
+
+    # In compact mode, only the coefficients of the WCs these events depend on are summed (see fill())
+    active = self._find_active(eft_coeff) if self._compact else None
+    helper, w_idx, w2_idx = self._subspace(active)
+    if active is not None:
+      eft_coeff = eft_coeff[:, w_idx]
+      if eft_err_coeff is not None: eft_err_coeff = eft_err_coeff[:, w2_idx]
+
+    # Check all the categories before modifying the histogram
+    for key in sparse_keys:
+      if key not in self._sumw: continue
+      if not self._is_eft_bin(key):
+        raise ValueError("Attempt to fill a non-EFT bin with EFT events.")
+      if with_errors and (self._sumw2 is None or self._sumw2[key] is None):
+        raise ValueError("Attempt to fill EFT error weights in a bin that was filled without them.")
+
+    # Initialize the bins that have never been filled, the same way as fill() does
+    for key in sparse_keys:
+      if key in self._sumw:
+        if self._compact and self._union_active(active, self._active_of(key)) != self._active_of(key):
+          self._change_active(key, self._union_active(active, self._active_of(key)))
+        continue
+      self._zero_bin(self._sumw, key, helper.get_w_coeffs())
+      if with_errors:
+        if self._sumw2 is None:
+          self._init_sumw2()
+        self._zero_bin(self._sumw2, key, helper.get_w2_coeffs())
+      elif self._sumw2 is not None:
+        self._sumw2[key] = None
+      if active is not None: self._active[key] = active
+
+    # One scatter for all the categories at once
+    sumw = self._scatter_coeffs(bins, ncats*ndense, eft_coeff, weight=weight, rows=events)
+    sumw = sumw.reshape(ncats, *self._dense_shape, helper.get_w_coeffs())
+    if eft_err_coeff is not None:
+      sumw2 = self._scatter_coeffs(bins, ncats*ndense, eft_err_coeff, weight=(weight**2 if weight is not None else None), rows=events)
+      sumw2 = sumw2.reshape(ncats, *self._dense_shape, helper.get_w2_coeffs())
+    elif gram_errors:
+      sumw2 = self._scatter_gram(bins, ncats*ndense, eft_coeff, weight=weight, rows=events, helper=helper)
+      sumw2 = sumw2.reshape(ncats, *self._dense_shape, helper.get_w2_coeffs())
+    if self._contiguous and not self._compact:
+      self._sumw.add_rows(self._sumw.alloc_rows(sparse_keys), sumw)
+      if with_errors:
+        self._sumw2.add_rows(self._sumw2.alloc_rows(sparse_keys), sumw2)
+      return
+    for i, key in enumerate(sparse_keys):
+      self._sumw[key] += self._embed(sumw[i], active, self._active_of(key))
+      if with_errors:
+        self._sumw2[key] += self._embed(sumw2[i], active, self._active_of(key), err=True)
+
+  def add(self, other, move=False):
+    """ Add another histogram into this one, in-place
+        move: if True, the arrays of the bins that this histogram does not have yet are moved here instead
+              of copied, and other is cleared (useful when other is not needed after the merge)
+    """
 
     if not self.compatible(other):
       raise ValueError("Cannot add this histogram with histogram %r of dissimilar dimensions" % other)
+    if self._linear != other._linear:
+      raise ValueError("Cannot add linear-only and quadratic EFT histograms")
+    self._unshare()
+    move = move and not other._is_shared() # The arrays of other also belong to another histogram
     raxes = other.sparse_axes()
+    laxes = [self.axis(rax) for rax in raxes]
+    dense_dim = self.dense_dim()
+
+    # Each identifier of other is only looked up once in the axes of this histogram
+    luts = [{} for _ in raxes]
+    def translate(rkey):
+      lkey = []
+      for lut, lax, ridx in zip(luts, laxes, rkey):
+        lidx = lut.get(ridx)
+        if lidx is None:
+          lidx = lut[ridx] = lax.index(ridx.name)
+        lkey.append(lidx)
+      return tuple(lkey)
+
+    def add_rows(left, right, comp):
+      # Both sides are contiguous: sum all the coefficient rows of right into left at once
+      rkeys = [rkey for rkey, _ in right.row_items()]
+      lkeys = [translate(rkey) for rkey in rkeys]
+      for lkey in lkeys:
+        if lkey in left and left.row(lkey) < 0 and left[lkey] is not None:
+          raise ValueError("Attempt to add histogram bins with EFT weights to ones without.")
+      rrows = np.fromiter((right.row(rkey) for rkey in rkeys), dtype=np.intp, count=len(rkeys))
+      lrows = left.alloc_rows(lkeys)
+      if comp is None:
+        left.add_from(lrows, right.array, rrows)
+      else:
+        # Each right key goes to a different left key, so the rows don't repeat
+        crows = comp.alloc_rows(lkeys)
+        for chunk in left.chunks(len(lrows)):
+          left.array[lrows[chunk]], err = self._two_sum(left.array[lrows[chunk]], right.array[rrows[chunk]])
+          comp.add_rows(crows[chunk], err)
 
-    def add_dict(left, right):
-      for rkey in right.keys():
-        lkey = tuple(self.axis(rax).index(rax[ridx]) for rax, ridx in zip(raxes, rkey))
+    def add_dict(left, right, comp=None, aligned=None, move=False):
+      if isinstance(left, CoeffBlock) and isinstance(right, CoeffBlock) and left.row_shape == right.row_shape:
+        add_rows(left, right, comp)
+        items = right.other_items()
+      else:
+        items = right.items()
+      for rkey, rval in items:
+        if aligned: rval = aligned.get(rkey, rval)
+        lkey = translate(rkey)
         if lkey in left and left[lkey] is not None:
           # Checking to make sure we don't accidentally try to sum a regular and EFT bin
-          if self.dense_dim() > 0:
-            if left[lkey].shape != right[rkey].shape:
+          lval = left[lkey]
+          if dense_dim > 0:
+            if lval.shape != rval.shape:
               raise ValueError("Attempt to add histogram bins with EFT weights to ones without.")
           else:
-            if isinstance(left[lkey],np.ndarray) != isinstance(right[rkey],np.ndarray):
+            if np.ndim(lval) != np.ndim(rval):
               raise ValueError("Attempt to add histogram bins with EFT weights to ones without.")
-          left[lkey] += right[rkey]
+          if comp is not None and isinstance(rval, np.ndarray):
+            left[lkey], err = self._two_sum(lval, rval)
+            if lkey in comp: comp[lkey] += err
+            else: comp[lkey] = np.asarray(err, dtype=self._dtype)
+          else:
+            left[lkey] += rval
+        elif move:
+          left[lkey] = rval
         else:
-          left[lkey] = copy.deepcopy(right[rkey])
+          left[lkey] = copy.deepcopy(rval)
+
+    # Compact EFT bins (see the compact option) are first moved to the union of the active WCs of
+    # the bins summed together, or to all the WCs if this histogram is not compact
+    targets, aligned_w, aligned_w2 = {}, {}, {}
+    if self._active or other._active:
+      other._fold_compensation()
+      for rkey in other._sumw:
+        if not other._is_eft_bin(rkey): continue
+        lkey = translate(rkey)
+        if not self._compact: targets[lkey] = None
+        elif lkey in targets: targets[lkey] = self._union_active(targets[lkey], other._active_of(rkey))
+        elif lkey in self._sumw: targets[lkey] = self._union_active(self._active_of(lkey), other._active_of(rkey))
+        else: targets[lkey] = other._active_of(rkey)
+      for lkey, target in targets.items():
+        if lkey in self._sumw and self._is_eft_bin(lkey) and self._active_of(lkey) != target:
+          self._change_active(lkey, target)
+      for rkey in other._sumw:
+        if not other._is_eft_bin(rkey) or other._active_of(rkey) == targets[translate(rkey)]: continue
+        aligned_w[rkey] = other._embed(other._sumw[rkey], other._active_of(rkey), targets[translate(rkey)])
+        if other._sumw2 is not None:
+          aligned_w2[rkey] = other._embed(other._sumw2[rkey], other._active_of(rkey), targets[translate(rkey)], err=True)
 
+    # With single precision storage, keep track of the rounding errors of the sums (see _two_sum)
+    if self._compensated():
+      if self._sumw_comp is None: self._sumw_comp = self._new_storage(self._ncoeffs)
+      if self._sumw2_comp is None and (self._sumw2 is not None or other._sumw2 is not None):
+        self._sumw2_comp = self._new_storage(self._nerrcoeffs)
+    other_comps = (other._sumw_comp, other._sumw2_comp)
+
+    # Note: other._sumw can't be moved into self._sumw2, it also goes to self._sumw
     if self._sumw2 is None and other._sumw2 is None: pass
     elif self._sumw2 is None:
       self._init_sumw2()
-      add_dict(self._sumw2, other._sumw2)
+      add_dict(self._sumw2, other._sumw2, self._sumw2_comp, aligned_w2, move)
     elif other._sumw2 is None:
-      add_dict(self._sumw2, other._sumw)
+      add_dict(self._sumw2, other._sumw, self._sumw2_comp, aligned_w)
     else:
-      add_dict(self._sumw2, other._sumw2)
-    add_dict(self._sumw, other._sumw)
+      add_dict(self._sumw2, other._sumw2, self._sumw2_comp, aligned_w2, move)
+    add_dict(self._sumw, other._sumw, self._sumw_comp, aligned_w, move)
+    if self._compact:
+      for lkey, target in targets.items():
+        if target is None: self._active.pop(lkey, None)
+        else: self._active[lkey] = target
+
+    # The compensation terms of other are small, they can be added the regular way
+    if other_comps[0] is not None:
+      if self._sumw_comp is not None:
+        add_dict(self._sumw_comp, other_comps[0])
+      else:
+        add_dict(self._sumw, other_comps[0])
+    if other_comps[1] is not None and self._sumw2 is not None:
+      if self._sumw2_comp is not None:
+        add_dict(self._sumw2_comp, other_comps[1])
+      else:
+        add_dict(self._sumw2, other_comps[1])
+    # The moved arrays now belong to this histogram
+    if move and other is not self: other.clear()
     return self 
 
   def __getitem__(self, keys):
@@ -262,6 +769,7 @@ class HistEFT(coffea.hist.Hist):
       else:
         slices = (slice(None),) * (self.dim() - len(keys))
         keys += slices
+    self._fold_compensation()
     sparse_idx, dense_idx, new_dims = [], [], []
 
     for s, ax in zip(keys, self._axes):
@@ -277,9 +785,24 @@ class HistEFT(coffea.hist.Hist):
     def dense_op(array):
       return np.block(coffea.hist.hist_tools.assemble_blocks(array, dense_idx))
 
-    out = HistEFT(self._label, self._wcnames, *new_dims, dtype=self._dtype)
-    out._wcs = copy.deepcopy(self._wcs)
+    out = self._new(*new_dims)
     if self._sumw2 is not None: out._init_sumw2()
+
+    # Selecting sparse bins over the full dense range: the result shares the arrays of this histogram,
+    # which are only copied when one of the two histograms is modified (see _unshare)
+    if all(islice.start is None and islice.stop is None for islice in dense_idx):
+      sparse_idx = [set(idx) for idx in sparse_idx]
+      selected = [key for key in self._sumw.keys() if all(k in idx for k, idx in zip(key, sparse_idx))]
+      def view(storage):
+        if isinstance(storage, CoeffBlock): return storage.view(selected)
+        return {key: storage[key] for key in selected}
+      out._sumw = view(self._sumw)
+      if self._sumw2 is not None: out._sumw2 = view(self._sumw2)
+      if self._active:
+        out._active = {key: active for key, active in self._active.items() if key in out._sumw}
+      self._share_with(out)
+      return out
+
     for sparse_key in self._sumw:
       if not all(k in idx for k, idx in zip(sparse_key, sparse_idx)):
         continue
@@ -301,16 +824,18 @@ class HistEFT(coffea.hist.Hist):
             out._sumw2[sparse_key] = dense_op(self._sumw2[sparse_key]).copy()
           else:
             out._sumw2[sparse_key] = None
+    if self._active:
+      out._active = {key: active for key, active in self._active.items() if key in out._sumw}
     return out
 
   def sum(self, *axes, **kwargs):
     """ Integrates out a set of axes, producing a new histogram 
         Project() and integrate() depends on sum() and are heritated """
     overflow = kwargs.pop('overflow', 'none')
+    self._fold_compensation()
     axes = [self.axis(ax) for ax in axes]
     reduced_dims = [ax for ax in self._axes if ax not in axes]
-    out = HistEFT(self._label, self._wcnames, *reduced_dims, dtype=self._dtype)
-    out._wcs = copy.deepcopy(self._wcs)
+    out = self._new(*reduced_dims)
     if self._sumw2 is not None: out._init_sumw2()
 
     sparse_drop = []
@@ -332,40 +857,106 @@ class HistEFT(coffea.hist.Hist):
         return np.sum(array[dense_slice], axis=dense_sum_dim)
       return array
 
-    for key in self._sumw.keys():
-      new_key = tuple(k for i, k in enumerate(key) if i not in sparse_drop)
+    def block_op(array):
+      # Same as dense_op, for a stack of arrays (first index is the sparse bin)
+      if len(dense_sum_dim) > 0:
+        return np.sum(array[(slice(None),)+dense_slice], axis=tuple(i+1 for i in dense_sum_dim))
+      return array
+
+    def key_map(key):
+      return tuple(k for i, k in enumerate(key) if i not in sparse_drop)
+
+    self._sum_into(out, [(key, key_map(key)) for key in self._sumw.keys()], dense_op, block_op)
+    return out
+
+  def _sum_into(self, out, pairs, dense_op, block_op):
+    """ Accumulate the sparse bins of this histogram into the histogram out
+        pairs: list of (sparse key of this histogram, sparse key in out), a key may go to several keys of out
+        dense_op: operation on the dense axes, applied to each array
+        block_op: same as dense_op, for a (nrows, *dense_shape, ncoeffs) stack of rows (with contiguous storage)
+    """
+    # Compact EFT bins summed together are moved to the union of their active WCs
+    targets = {}
+    if self._active:
+      for key, new_key in pairs:
+        if not self._is_eft_bin(key): continue
+        targets[new_key] = self._union_active(targets[new_key], self._active_of(key)) if new_key in targets else self._active_of(key)
+
+    if self._contiguous:
+      # All the EFT bins are summed at once, only the rest go through the loop below
+      self._sum_rows_into(out, [(key, new_key) for key, new_key in pairs if self._sumw.row(key) >= 0], block_op)
+      pairs = [(key, new_key) for key, new_key in pairs if self._sumw.row(key) < 0]
+
+    for key, new_key in pairs:
+      sumw = self._sumw[key]
+      sumw2 = self._sumw2[key] if self._sumw2 is not None else None
+      if targets and self._is_eft_bin(key):
+        sumw = self._embed(sumw, self._active_of(key), targets[new_key])
+        sumw2 = self._embed(sumw2, self._active_of(key), targets[new_key], err=True)
       if new_key in out._sumw:
         # Check that we're not trying to combine EFT and non-EFT bins
         if self.dense_dim() > 0:
-          if out._sumw[new_key].shape != self._sumw[key].shape:
+          if out._sumw[new_key].shape != sumw.shape:
             raise ValueError("Attempt to sum bins with EFT weights to ones without.")
         else:
-          if isinstance(out._sumw[new_key],np.ndarray) != isinstance(self._sumw[key],np.ndarray):
+          if np.ndim(out._sumw[new_key]) != np.ndim(sumw):
             raise ValueError("Attempt to sum bins with EFT weights to ones without.")
-        out._sumw[new_key] += dense_op(self._sumw[key])
+        out._sumw[new_key] += dense_op(sumw)
         if self._sumw2 is not None:
-          if self._sumw2[key] is not None:
+          if sumw2 is not None:
             if out._sumw2[new_key] is not None:
-              out._sumw2[new_key] += dense_op(self._sumw2[key])
+              out._sumw2[new_key] += dense_op(sumw2)
             else:
               raise ValueError('Cannot combine bins where only some have EFT error weights')
           else:
             if out._sumw2[new_key] is not None:
               raise ValueError('Tried to combine bins with and without EFT error weights')
       else:
-        out._sumw[new_key] = dense_op(self._sumw[key]).copy()
+        out._sumw[new_key] = dense_op(sumw).copy()
         if self._sumw2 is not None:
-          if self._sumw2[key] is not None:
-            out._sumw2[new_key] = dense_op(self._sumw2[key]).copy()
+          if sumw2 is not None:
+            out._sumw2[new_key] = dense_op(sumw2).copy()
           else:
             out._sumw2[new_key] = None
-              
-    return out
 
+    for new_key, target in targets.items():
+      if target is not None: out._active[new_key] = target
+
+  def _sum_rows_into(self, out, pairs, block_op):
+    """ Accumulate EFT coefficient rows of this (contiguous) histogram into the histogram out
+        pairs: list of (sparse key of this histogram, sparse key in out), for keys stored as rows
+        block_op: operation on the dense axes, applied to a (nrows, *dense_shape, ncoeffs) stack of rows
+    """
+    if len(pairs) == 0: return
+    keys, new_keys = [key for key, _ in pairs], [new_key for _, new_key in pairs]
+    for new_key in set(new_keys):
+      if new_key in out._sumw and out._sumw.row(new_key) < 0:
+        raise ValueError("Attempt to sum bins with EFT weights to ones without.")
+    rows = np.fromiter((self._sumw.row(key) for key in keys), dtype=np.intp, count=len(keys))
+    out._sumw.add_from(out._sumw.alloc_rows(new_keys), self._sumw.array, rows, block_op)
+    if self._sumw2 is None: return
+
+    # Bins with and without EFT error weights can't be combined
+    has_err = {}
+    for key, new_key in zip(keys, new_keys):
+      if new_key in has_err: continue
+      has_err[new_key] = out._sumw2.row(new_key) >= 0 if new_key in out._sumw2 else self._sumw2.row(key) >= 0
+    err_pairs = []
+    for key, new_key in pairs:
+      if (self._sumw2.row(key) >= 0) != has_err[new_key]:
+        raise ValueError('Cannot combine bins where only some have EFT error weights')
+      if has_err[new_key]: err_pairs.append((key, new_key))
+    for new_key, err in has_err.items():
+      if not err: out._sumw2[new_key] = None
+    if len(err_pairs) == 0: return
+    rows = np.fromiter((self._sumw2.row(key) for key, _ in err_pairs), dtype=np.intp, count=len(err_pairs))
+    out._sumw2.add_from(out._sumw2.alloc_rows([new_key for _, new_key in err_pairs]), self._sumw2.array, rows, block_op)
 
   def group(self, old_axes, new_axis, mapping, overflow='none'): 
-    """ Group a set of slices on old axes into a single new axis """
-    ### WARNING: check that this function works properly... (TODO) --> Are the EFT coefficients properly grouped?
+    """ Group a set of slices on old axes into a single new axis
+        When all the old axes are sparse, the new category (or categories) of each sparse bin is worked out once
+        and the bins are accumulated in a single pass, instead of slicing and summing for each new category
+    """
     if not isinstance(new_axis, coffea.hist.hist_tools.SparseAxis):
       raise TypeError("New axis must be a sparse axis.  Note: Hist.group() signature has changed to group(old_axes, new_axis, ...)!")
     if new_axis in self.axes() and self.axis(new_axis) is new_axis:
@@ -374,14 +965,33 @@ class HistEFT(coffea.hist.Hist):
     old_axes = [self.axis(ax) for ax in old_axes]
     old_indices = [i for i, ax in enumerate(self._axes) if ax in old_axes]
     new_dims = [new_axis] + [ax for ax in self._axes if ax not in old_axes]
-    out = HistEFT(self._label, self._wcnames, *new_dims, dtype=self._dtype)
-    out._wcs = copy.deepcopy(self._wcs)
+    out = self._new(*new_dims)
     if self._sumw2 is not None: out._init_sumw2()
+    slices = {}
     for new_cat in mapping.keys():
       the_slice = mapping[new_cat]
       if not isinstance(the_slice, tuple): the_slice = (the_slice,)
       if len(the_slice) != len(old_axes):
         raise Exception("Slicing does not match number of axes being rebinned")
+      slices[new_cat] = the_slice
+
+    if all(isinstance(ax, coffea.hist.hist_tools.SparseAxis) for ax in old_axes):
+      self._fold_compensation()
+      isparse = [self._isparse(ax) for ax in old_axes]
+      kept = [i for i in range(len(self.sparse_axes())) if i not in isparse]
+      # Identifiers of the old axes selected by each new category
+      selections = [(new_axis.index(new_cat), [set(ax._ireduce(s)) for ax, s in zip(old_axes, the_slice)]) for new_cat, the_slice in slices.items()]
+      pairs = []
+      for key in self._sumw.keys():
+        old_ids = [key[i] for i in isparse]
+        kept_key = tuple(key[i] for i in kept)
+        for new_idx, selection in selections:
+          if all(k in sel for k, sel in zip(old_ids, selection)):
+            pairs.append((key, (new_idx,) + kept_key))
+      self._sum_into(out, pairs, lambda array: array, lambda array: array)
+      return out
+
+    for new_cat, the_slice in slices.items():
       full_slice = [slice(None)] * self.dim()
       for idx, s in zip(old_indices, the_slice): full_slice[idx] = s
       full_slice = tuple(full_slice)
@@ -390,6 +1000,8 @@ class HistEFT(coffea.hist.Hist):
       for key in reduced_hist._sumw:
         new_key = (new_idx,) + key
         out._sumw[new_key] = reduced_hist._sumw[key]
+        if reduced_hist._active_of(key) is not None:
+          out._active[new_key] = reduced_hist._active_of(key)
         if self._sumw2 is not None:
           if reduced_hist._sumw2[key] is not None:
             out._sumw2[new_key] = reduced_hist._sumw2[key]
@@ -399,35 +1011,59 @@ class HistEFT(coffea.hist.Hist):
     return out
 
   def rebin(self, old_axis, new_axis):
-    """ Rebin a dense axis """
+    """ Rebin a dense axis
+        The map from old to new bins (including the overflow bins) is worked out once, each new bin is then
+        the sum of a range of old bins, for all the sparse bins at once with contiguous storage
+    """
+    self._fold_compensation()
     old_axis = self.axis(old_axis)
     if isinstance(new_axis, numbers.Integral):
         new_axis = Bin(old_axis.name, old_axis.label, old_axis.edges()[::new_axis])
     new_dims = [ax if ax != old_axis else new_axis for ax in self._axes]
-    out = HistEFT(self._label, self._wcnames, *new_dims, dtype=self._dtype)
-    out._wcs = copy.deepcopy(self._wcs)
+    out = self._new(*new_dims)
     if self._sumw2 is not None: out._init_sumw2()
     idense = self._idense(old_axis)
+    nnew = out._dense_shape[idense]
 
-    def view_ax(idx):
-      fullindex = [slice(None)] * self.dense_dim()
-      fullindex[idense] = idx
-      return tuple(fullindex)
-    binmap = [new_axis.index(i) for i in old_axis.identifiers(overflow='allnan')]
+    # Old bins sorted by new bin, so that each new bin sums a contiguous range of them
+    binmap = np.array([new_axis.index(i) for i in old_axis.identifiers(overflow='allnan')], dtype=np.intp)
+    order = np.argsort(binmap, kind='stable')
+    sorted_map = binmap[order]
+    starts = np.flatnonzero(np.r_[True, sorted_map[1:] != sorted_map[:-1]])
+    ranges = list(zip(sorted_map[starts], starts, np.r_[starts[1:], len(sorted_map)]))
+    reorder = not np.array_equal(order, np.arange(len(order)))
 
-    def dense_op(array):
-      anew = np.zeros(shape=(*out._dense_shape,out._ncoeffs), dtype=out._dtype)
-      for iold, inew in enumerate(binmap):
-        anew[view_ax(inew)] += array[view_ax(iold)]
+    def dense_op(array, axis=idense):
+      if reorder: array = np.take(array, order, axis=axis)
+      anew = np.zeros(shape=(*array.shape[:axis], nnew, *array.shape[axis+1:]), dtype=out._dtype)
+      lead = (slice(None),) * axis
+      for inew, first, last in ranges:
+        np.sum(array[lead + (slice(first, last),)], axis=axis, out=anew[lead + (inew,)])
       return anew
 
-    for key in self._sumw:
-      out._sumw[key] = dense_op(self._sumw[key])
-      if self._sumw2 is not None:
-        if self._sumw2[key] is not None:
-          out._sumw2[key] = dense_op(self._sumw2[key])
-        else:
-          out._sumw2[key] = None
+    def rebin_storage(storage, new_storage):
+      items = storage.items()
+      if isinstance(storage, CoeffBlock):
+        keys = [key for key, _ in storage.row_items()]
+        if len(keys) > 0:
+          rows = np.fromiter((storage.row(key) for key in keys), dtype=np.intp, count=len(keys))
+          if storage.on_disk:
+            # Rebin a chunk of rows at a time into the new block
+            new_rows = new_storage.alloc_rows(keys)
+            for chunk in storage.chunks(len(keys)):
+              new_storage.array[new_rows[chunk]] = dense_op(storage.array[rows[chunk]], idense+1)
+          else:
+            block = storage.array if np.array_equal(rows, np.arange(len(storage.array))) else storage.array[rows]
+            new_storage = CoeffBlock.from_array(dense_op(block, idense+1), keys)
+        items = storage.other_items()
+      for key, array in items:
+        new_storage[key] = dense_op(array) if array is not None else None
+      return new_storage
+
+    out._sumw = rebin_storage(self._sumw, out._sumw)
+    if self._sumw2 is not None:
+      out._sumw2 = rebin_storage(self._sumw2, out._sumw2)
+    out._active = dict(self._active or {})
 
     return out
 
@@ -444,7 +1080,31 @@ class HistEFT(coffea.hist.Hist):
     where each array has dimension `dense_dim` and shape matching
     the number of bins per axis, plus 0-3 overflow bins depending
     on the ``overflow`` argument.
+
+    With the values_cache option, the result is cached for the current WC point and a copy of it is returned.
     """
+    if not self._values_cache_size:
+      return self._values(sumw2, overflow)
+    if self._values_cache is None: self._values_cache = OrderedDict()
+    cache_key = (np.asarray(self._wcs, dtype=float).tobytes(), overflow, sumw2)
+    out = self._values_cache.get(cache_key)
+    if out is None:
+      out = self._values(sumw2, overflow)
+      self._values_cache[cache_key] = out
+      while len(self._values_cache) > self._values_cache_size:
+        self._values_cache.popitem(last=False)
+    else:
+      self._values_cache.move_to_end(cache_key)
+
+    def copy(arr):
+      return arr.copy() if isinstance(arr, np.ndarray) else arr
+    if sumw2:
+      return {k: (copy(w), copy(w2)) for k, (w, w2) in out.items()}
+    return {k: copy(w) for k, w in out.items()}
+
+  def _values(self, sumw2, overflow):
+    """ Evaluate values() at the current WC point """
+    self._fold_compensation()
 
     def view_dim(arr):
       if self.dense_dim() == 0:
@@ -454,27 +1114,38 @@ class HistEFT(coffea.hist.Hist):
           tuple(coffea.hist.hist_tools.overflow_behavior(overflow) for _ in range(self.dense_dim()))
         ]
 
+    # With contiguous storage, evaluate all the EFT bins in one go
+    eft_sumw, eft_sumw2 = {}, {}
+    if self._contiguous:
+      eft_sumw = self._map_rows(self._sumw, lambda coeffs: self._eft_helper.calc_eft_weights(coeffs, self._wcs))
+      if sumw2 and self._sumw2 is not None:
+        eft_sumw2 = self._map_rows(self._sumw2, lambda coeffs: self._eft_helper.calc_eft_w2(coeffs, self._wcs))
+
     out = {}
     for sparse_key in self._sumw.keys():
       id_key = tuple(ax[k] for ax, k in zip(self.sparse_axes(), sparse_key))
 
       # Now we have to "pay the piper" an actually calculate bin contents from the bin coefficients
       # Start by figuring out if this is an EFT bin or not
-      if self.dense_dim() > 0:
-        is_eft_bin = (self._sumw[sparse_key].shape != self._dense_shape)
-      else:
-        is_eft_bin = isinstance(self._sumw[sparse_key],np.ndarray)
+      is_eft_bin = self._is_eft_bin(sparse_key)
+
+      # Compact bins are evaluated with the helper for their active WCs
+      active = self._active_of(sparse_key)
+      helper, wcs = (self._eft_helper, self._wcs) if active is None else (self._subspace(active)[0], self._wcs[list(active)])
 
       if is_eft_bin:
-        _sumw = self._eft_helper.calc_eft_weights(self._sumw[sparse_key],self._wcs)
+        if sparse_key in eft_sumw: _sumw = eft_sumw[sparse_key]
+        else: _sumw = helper.calc_eft_weights(self._sumw[sparse_key],wcs)
       else:
         _sumw = self._sumw[sparse_key]
 
       if sumw2:
         if self._sumw2 is not None:
             if is_eft_bin:
-              if self._sumw2[sparse_key] is not None:
-                _sumw2 = self._eft_helper.calc_eft_w2(self._sumw2[sparse_key],self._wcs)  
+              if sparse_key in eft_sumw2:
+                _sumw2 = eft_sumw2[sparse_key]
+              elif self._sumw2[sparse_key] is not None:
+                _sumw2 = helper.calc_eft_w2(self._sumw2[sparse_key],wcs)
               else:
                 # Set really tiny error bars (e.g. one one-millionth the size of the average bin)
                 _sumw2 = np.full_like(_sumw,1e-30*np.mean(_sumw))
@@ -493,15 +1164,167 @@ class HistEFT(coffea.hist.Hist):
 
     return out
 
+  def values_at(self, points, sumw2=False, overflow="none"):
+    """Extract the sum of weights arrays at many WC points at once
+    Parameters
+    ----------
+        points : array
+            Array of shape (npoints, nwc) with the WC values of each point (in the order of the WC names)
+        sumw2 : bool
+            If True, frequencies is a tuple of arrays (sum weights, sum squared weights)
+        overflow
+           See `sum` description for meaning of allowed values
+
+    Returns a mapping ``{(sparse identifier, ...): numpy.array(...), ...}`` like `values`,
+    but each array has an extra first dimension of size npoints. The yields at all the points
+    are obtained with a single matrix product against the monomials of the WCs.
+    """
+    self._fold_compensation()
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    npoints = points.shape[0]
+    if points.shape[1] != self._nwc:
+      raise ValueError("Wrong number of WC values.  Expecting {}, received {}".format(self._nwc, points.shape[1]))
+
+    def view_dim(arr):
+      if self.dense_dim() == 0:
+        return arr
+      else:
+        return arr[
+          (slice(None),)+tuple(coffea.hist.hist_tools.overflow_behavior(overflow) for _ in range(self.dense_dim()))
+        ]
+
+    def tiny_errors(arr):
+      # Set really tiny error bars (e.g. one one-millionth the size of the average bin), separately for each point
+      dense_axes = tuple(range(1, arr.ndim))
+      return np.ones_like(arr)*1e-30*np.mean(arr, axis=dense_axes, keepdims=True)
+
+    w_mono = self._eft_helper.get_w_monomials(points)
+    w2_mono = self._eft_helper.get_w2_monomials(points) if (sumw2 and self._sumw2 is not None) else None
+
+    # With contiguous storage, evaluate all the EFT bins in one go
+    eft_sumw, eft_sumw2 = {}, {}
+    if self._contiguous:
+      eft_sumw = self._map_rows(self._sumw, lambda coeffs: np.moveaxis(coeffs @ w_mono.T, -1, 1))
+      if w2_mono is not None:
+        eft_sumw2 = self._map_rows(self._sumw2, lambda coeffs: np.moveaxis(coeffs @ w2_mono.T, -1, 1))
+
+    out = {}
+    for sparse_key in self._sumw.keys():
+      id_key = tuple(ax[k] for ax, k in zip(self.sparse_axes(), sparse_key))
+
+      is_eft_bin = self._is_eft_bin(sparse_key)
+
+      # Compact bins are evaluated with the monomials of their active WCs
+      active = self._active_of(sparse_key)
+      if active is not None:
+        helper = self._subspace(active)[0]
+        key_w_mono = helper.get_w_monomials(points[:, list(active)])
+        key_w2_mono = helper.get_w2_monomials(points[:, list(active)]) if w2_mono is not None else None
+      else:
+        key_w_mono, key_w2_mono = w_mono, w2_mono
+
+      if is_eft_bin:
+        if sparse_key in eft_sumw: _sumw = eft_sumw[sparse_key]
+        else: _sumw = np.moveaxis(self._sumw[sparse_key] @ key_w_mono.T, -1, 0)
+      else:
+        # Regular bins don't depend on the WCs
+        _sumw = np.broadcast_to(self._sumw[sparse_key], (npoints, *np.shape(self._sumw[sparse_key])))
+
+      if sumw2:
+        if is_eft_bin:
+          if sparse_key in eft_sumw2:
+            _sumw2 = eft_sumw2[sparse_key]
+          elif self._sumw2 is not None and self._sumw2[sparse_key] is not None:
+            _sumw2 = np.moveaxis(self._sumw2[sparse_key] @ key_w2_mono.T, -1, 0)
+          else:
+            _sumw2 = tiny_errors(_sumw)
+        elif self._sumw2 is not None:
+          _sumw2 = np.broadcast_to(self._sumw2[sparse_key], _sumw.shape)
+        else:
+          _sumw2 = _sumw
+        out[id_key] = (view_dim(_sumw), view_dim(_sumw2))
+      else:
+        out[id_key] = view_dim(_sumw)
+
+    return out
+
+  def _map_rows(self, storage, func):
+    """ {sparse key: result} with func applied to the coefficient rows of a CoeffBlock, stacked (func gets a
+        (nrows, *dense_shape, ncoeffs) array and returns one result per row), a chunk of rows at a time if the
+        block is on disk
+    """
+    keys = [key for key, _ in storage.row_items()]
+    rows = np.fromiter((storage.row(key) for key in keys), dtype=np.intp, count=len(keys))
+    out = {}
+    for chunk in storage.chunks(len(keys)):
+      out.update(zip(keys[chunk], func(storage.array[rows[chunk]])))
+    return out
+
+  def _eval_coeffs(self, func, overflow="none"):
+    """ Apply func(coeffs) to the EFT coefficients of all the sparse bins (at once for the contiguous ones),
+        the bins without EFT coefficients are treated as having only the SM term
+        Returns a mapping {(sparse identifier, ...): numpy.array(...), ...} like values()
+    """
+    self._fold_compensation()
+    block = self._map_rows(self._sumw, func) if self._contiguous else {}
+
+    out = {}
+    for sparse_key in self._sumw.keys():
+      id_key = tuple(ax[k] for ax, k in zip(self.sparse_axes(), sparse_key))
+      if sparse_key in block:
+        res = block[sparse_key]
+      elif self._is_eft_bin(sparse_key):
+        # Compact bins are first expressed with all the WCs
+        res = func(self._embed(self._sumw[sparse_key], self._active_of(sparse_key), None))
+      else:
+        coeffs = np.zeros((*np.shape(self._sumw[sparse_key]), self._ncoeffs))
+        coeffs[..., 0] = self._sumw[sparse_key]
+        res = func(coeffs)
+      if self.dense_dim() > 0:
+        res = res[tuple(coffea.hist.hist_tools.overflow_behavior(overflow) for _ in range(self.dense_dim()))]
+      out[id_key] = res
+    return out
+
+  def quadratic_forms(self, overflow="none"):
+    """ Symmetric (nwc+1, nwc+1) matrix of each bin, such that the bin content is x @ A @ x with x = [1]+WC values
+        Returns a mapping ``{(sparse identifier, ...): numpy.array(...), ...}`` like `values`, each array
+        has two extra dimensions
+    """
+    return self._eval_coeffs(self._eft_helper.get_quadratic_form, overflow)
+
+  def gradient_at(self, point, overflow="none"):
+    """ Gradient of the bin contents with respect to the WCs, at the given WC point (exact, from the EFT coefficients)
+        Returns a mapping ``{(sparse identifier, ...): numpy.array(...), ...}`` like `values`, each array
+        has an extra last dimension of size nwc
+    """
+    point = np.asarray(point, dtype=float)
+    if point.shape != (self._nwc,):
+      raise ValueError("Wrong number of WC values.  Expecting {}, received {}".format(self._nwc, point.size))
+    monomials = self._eft_helper.get_gradient_monomials(point)
+    return self._eval_coeffs(lambda coeffs: coeffs @ monomials, overflow)
+
+  def hessian_at(self, point=None, overflow="none"):
+    """ Hessian matrix of the bin contents with respect to the WCs
+        The bin contents are quadratic functions of the WCs, so the Hessian is the same at every point
+        (point is only accepted for symmetry with gradient_at)
+        Returns a mapping ``{(sparse identifier, ...): numpy.array(...), ...}`` like `values`, each array
+        has two extra last dimensions of size nwc
+    """
+    monomials = self._eft_helper.get_hessian_monomials()
+    return self._eval_coeffs(lambda coeffs: np.tensordot(coeffs, monomials, axes=([-1], [0])), overflow)
+
   def scale(self, factor, axis=None):
     """Scale histogram in-place by factor
     Parameters
     ----------
-      factor : float or dict
-              A number or mapping of identifier to number
+      factor : float or dict or numpy.ndarray
+              A number, mapping of identifier to number, or array with one number per bin of a dense axis
       axis : optional
              Which (sparse) axis the dict applies to, may be a tuples of axes.
              The dict keys must follow the same structure.
+             For an array, which dense axis (or tuple of dense axes, one per dimension of the array) it applies to.
+             The array covers either all the bins of the axis (including under/overflow and nan) or only the
+             regular ones (the under/overflow and nan bins are then left as they are).
     Examples
     --------
     This function is useful to quickly reweight according to some
@@ -510,7 +1333,10 @@ class HistEFT(coffea.hist.Hist):
     >>> h.scale({'ducks': 0.3, 'geese': 1.2}, axis='species')
     >>> h.scale({('ducks',): 0.5}, axis=('species',))
     >>> h.scale({('geese', 'honk'): 5.0}, axis=('species', 'vocalization'))
+    >>> h.scale(np.array([1.1, 1.05, 0.95]), axis='njets')
     """
+    self._unshare()
+    self._fold_compensation()
     if self._sumw2 is None:
       self._init_sumw2()
     if isinstance(factor, numbers.Number) and axis is None:
@@ -533,9 +1359,40 @@ class HistEFT(coffea.hist.Hist):
           self._sumw[key] *= factor[factor_key]
           if self._sumw2[key] is not None:
             self._sumw2[key] *= factor[factor_key] ** 2
-    elif isinstance(factor, numpy.ndarray):
-      axis = self.axis(axis)
-      raise NotImplementedError("Scale dense dimension by a factor")
+    elif isinstance(factor, np.ndarray):
+      # One factor per bin of a dense axis (or per bin of several dense axes, for a tuple of axes), with either
+      # all the bins of the axis (including under/overflow and nan, i.e. axis.size) or only the regular ones
+      if not isinstance(axis, tuple): axis = (axis,)
+      axis = tuple(map(self.axis, axis))
+      if not all(isinstance(ax, DenseAxis) for ax in axis):
+        raise ValueError("An array of scale factors can only be applied along dense axes")
+      if factor.ndim != len(axis):
+        raise ValueError("The array of scale factors should have one dimension per axis, got %i for %i axes" % (factor.ndim, len(axis)))
+      full_factor = np.ones([ax.size for ax in axis])
+      bins = []
+      for ax, n in zip(axis, factor.shape):
+        if n == ax.size: bins.append(slice(None))
+        elif n == ax.size - 3: bins.append(slice(1, -2))
+        else: raise ValueError("Wrong number of scale factors for axis %r: %i (expected %i or %i)" % (ax.name, n, ax.size - 3, ax.size))
+      full_factor[tuple(bins)] = factor
+      # Broadcast against the dense dimensions of the bins
+      idense = [self._idense(ax) for ax in axis]
+      full_factor = full_factor.transpose(np.argsort(idense))
+      shape = [1] * self.dense_dim()
+      for i in idense: shape[i] = self._dense_shape[i]
+      dense_factor = full_factor.reshape(shape)
+
+      # The EFT bins get the same factor for all their coefficients (the square of the factor for sumw2)
+      for storage, f in ((self._sumw, dense_factor), (self._sumw2, dense_factor ** 2)):
+        items = storage.items()
+        if isinstance(storage, CoeffBlock):
+          # All the EFT bins at once (a chunk of them at a time if the block is on disk)
+          for chunk in storage.chunks(len(storage.array)):
+            storage.array[chunk] *= f[None, ..., None]
+          items = storage.other_items()
+        for key, array in items:
+          if array is None: continue
+          array *= f[..., None] if array.ndim > self.dense_dim() else f
     else:
       raise TypeError("Could not interpret scale factor")
 
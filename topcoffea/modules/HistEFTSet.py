@@ -0,0 +1,171 @@
+"""
+ HistEFTSet class - a set of histograms (e.g. one per variable) that share the same sparse axes
+ Behaves like the {name: histogram} dict of the processor output, with group(), integrate(), sum() and scale()
+ methods that act on all the histograms at once.
+
+ For the operations on sparse axes, the map from the sparse keys of the input to the sparse keys of the output
+ (e.g. which samples go to each process in group()) is worked out once, on the union of the keys of all the
+ HistEFTs with the same sparse axes, and then applied to the coefficients of each of them.  Operations on dense
+ axes, and plain coffea hists, are simply done one histogram at a time.  Histograms that don't have the axes of
+ an operation (e.g. a sum of weights histogram without a channel axis) are kept as they are.
+
+ Example:
+   hists = HistEFTSet(output)
+   hists = hists.group('sample', hist.Cat('process', 'process'), {'ttH': 'ttHJet_*', 'ttll': 'TTZToLL*'})
+   hists = hists.integrate('channel', ['eemSSonZ', 'mmeSSonZ']).integrate('cut', 'base')
+   h = hists['njets']
+"""
+
+import copy
+import coffea.hist
+from collections.abc import MutableMapping
+
+from topcoffea.modules.HistEFT import HistEFT
+
+class HistEFTSet(MutableMapping):
+
+  def __init__(self, hists=None):
+    """ Initialize from a mapping {name: histogram}, other objects in the mapping are kept but never modified """
+    self._hists = dict(hists) if hists is not None else {}
+
+  def __getitem__(self, name):
+    return self._hists[name]
+
+  def __setitem__(self, name, h):
+    self._hists[name] = h
+
+  def __delitem__(self, name):
+    del self._hists[name]
+
+  def __iter__(self):
+    return iter(self._hists)
+
+  def __len__(self):
+    return len(self._hists)
+
+  def _has_axes(self, h, axes):
+    return isinstance(h, coffea.hist.Hist) and all(ax in [a.name for a in h.axes()] for ax in axes)
+
+  def _layouts(self, axes):
+    """ The HistEFTs that have all the axes as sparse axes, grouped by the names of their sparse axes """
+    layouts = {}
+    for name, h in self._hists.items():
+      if not isinstance(h, HistEFT): continue
+      sparse_names = tuple(ax.name for ax in h.sparse_axes())
+      if all(ax in sparse_names for ax in axes):
+        layouts.setdefault(sparse_names, []).append(name)
+    return layouts
+
+  def _merged_axes(self, names, axes):
+    """ Copies of the axes of the first of the histograms names, holding the identifiers of all of them """
+    hists = [self._hists[name] for name in names]
+    merged = []
+    for ax_name in axes:
+      axis = copy.deepcopy(hists[0].axis(ax_name))
+      for h in hists[1:]:
+        for identifier in h.axis(ax_name).identifiers(): axis.index(identifier)
+      merged.append(axis)
+    return merged
+
+  def _keys(self, names):
+    """ Union of the sparse keys of the histograms names """
+    keys = {}
+    for name in names:
+      for key in self._hists[name]._sumw.keys(): keys.setdefault(key, None)
+    return list(keys)
+
+  def _apply(self, names, plan, new_dims):
+    """ New histograms with the bins of the histograms names accumulated as given by plan
+        plan: {sparse key of the input: list of sparse keys in the output}
+        new_dims: function giving the axes of the output for an input histogram
+    """
+    out = {}
+    for name in names:
+      h = self._hists[name]
+      h._fold_compensation()
+      new = h._new(*new_dims(h))
+      if h._sumw2 is not None: new._init_sumw2()
+      pairs = [(key, new_key) for key in h._sumw.keys() for new_key in plan[key]]
+      h._sum_into(new, pairs, lambda array: array, lambda array: array)
+      out[name] = new
+    return out
+
+  def _replace(self, new_hists):
+    out = HistEFTSet(self._hists)
+    out._hists.update(new_hists)
+    return out
+
+  def group(self, old_axes, new_axis, mapping, overflow='none'):
+    """ Group a set of slices on old axes into a single new axis, for all the histograms (see HistEFT.group) """
+    if not isinstance(old_axes, tuple): old_axes = (old_axes,)
+    old_axes = tuple(ax.name if isinstance(ax, coffea.hist.hist_tools.Axis) else ax for ax in old_axes)
+    slices = {}
+    for new_cat, the_slice in mapping.items():
+      if not isinstance(the_slice, tuple): the_slice = (the_slice,)
+      if len(the_slice) != len(old_axes):
+        raise Exception("Slicing does not match number of axes being rebinned")
+      slices[new_cat] = the_slice
+
+    new_hists = {}
+    for layout, names in self._layouts(old_axes).items():
+      isparse = [layout.index(ax) for ax in old_axes]
+      kept = [i for i in range(len(layout)) if i not in isparse]
+      # Identifiers of the old axes selected by each new category
+      merged = self._merged_axes(names, old_axes)
+      selections = [(new_cat, [set(ax._ireduce(s)) for ax, s in zip(merged, the_slice)]) for new_cat, the_slice in slices.items()]
+      cat_plan = {}
+      for key in self._keys(names):
+        kept_key = tuple(key[i] for i in kept)
+        cat_plan[key] = [(new_cat, kept_key) for new_cat, selection in selections if all(key[i] in sel for i, sel in zip(isparse, selection))]
+      # Each output histogram gets its own copy of the new axis
+      for name in names:
+        axis = copy.deepcopy(new_axis)
+        plan = {key: [(axis.index(new_cat),) + kept_key for new_cat, kept_key in cats] for key, cats in cat_plan.items()}
+        new_hists.update(self._apply([name], plan, lambda h: [axis] + [ax for ax in h._axes if ax.name not in old_axes]))
+
+    for name, h in self._hists.items():
+      if name not in new_hists and self._has_axes(h, old_axes):
+        new_hists[name] = h.group(old_axes, copy.deepcopy(new_axis), mapping, overflow=overflow)
+    return self._replace(new_hists)
+
+  def sum(self, *axes, **kwargs):
+    """ Integrate out a set of axes in all the histograms (see HistEFT.sum) """
+    overflow = kwargs.pop('overflow', 'none')
+    axes = tuple(ax.name if isinstance(ax, coffea.hist.hist_tools.Axis) else ax for ax in axes)
+    new_hists = {}
+    for layout, names in self._layouts(axes).items():
+      drop = [layout.index(ax) for ax in axes]
+      plan = {key: [tuple(k for i, k in enumerate(key) if i not in drop)] for key in self._keys(names)}
+      new_hists.update(self._apply(names, plan, lambda h: [ax for ax in h._axes if ax.name not in axes]))
+
+    for name, h in self._hists.items():
+      if name not in new_hists and self._has_axes(h, axes):
+        new_hists[name] = h.sum(*axes, overflow=overflow)
+    return self._replace(new_hists)
+
+  def integrate(self, axis_name, int_range=slice(None), overflow='none'):
+    """ Integrate all the histograms along one axis (see coffea.hist.Hist.integrate) """
+    if isinstance(axis_name, coffea.hist.hist_tools.Axis): axis_name = axis_name.name
+    new_hists = {}
+    for layout, names in self._layouts((axis_name,)).items():
+      isparse = layout.index(axis_name)
+      selected = set(self._merged_axes(names, (axis_name,))[0]._ireduce(int_range))
+      plan = {key: ([key[:isparse] + key[isparse+1:]] if key[isparse] in selected else []) for key in self._keys(names)}
+      new_hists.update(self._apply(names, plan, lambda h: [ax for ax in h._axes if ax.name != axis_name]))
+
+    for name, h in self._hists.items():
+      if name not in new_hists and self._has_axes(h, (axis_name,)):
+        new_hists[name] = h.integrate(axis_name, int_range, overflow=overflow)
+    return self._replace(new_hists)
+
+  def scale(self, factor, axis=None):
+    """ Scale all the histograms (that have the axis, if one is given) in place (see HistEFT.scale) """
+    axes = () if axis is None else axis if isinstance(axis, tuple) else (axis,)
+    axes = tuple(ax.name if isinstance(ax, coffea.hist.hist_tools.Axis) else ax for ax in axes)
+    for h in self._hists.values():
+      if self._has_axes(h, axes): h.scale(factor, axis=axis)
+
+  def set_wilson_coefficients(self, values):
+    """ Set the WC values of all the HistEFTs """
+    for h in self._hists.values():
+      if isinstance(h, HistEFT): h.set_wilson_coefficients(values)
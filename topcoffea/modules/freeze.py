@@ -0,0 +1,90 @@
+'''
+ Conversion of the HistEFTs of an output to plain coffea hists at fixed WC points ("freezing" them)
+
+ The plotting and datacard steps only need the bin contents at one or a few WC points.  Instead of setting the
+ WCs and calling values() on every histogram and sparse key each time, all the histograms are evaluated at all
+ the points up front: for each histogram, the yields of all its bins at all the points come from a single
+ product of the coefficients with the monomials of the points (see HistEFT.values_at).  The histograms can be
+ spread over a pool of processes (anything with a map method, e.g. a ProcessPoolExecutor).
+
+ Example:
+   frozen = freeze(output, [{}, {'ctW': 1.}, {'ctW': -1.}])  # SM, ctW=+1 and ctW=-1
+   hist.plot1d(frozen[1]['njets'].sum('sample', 'channel', 'cut'))
+   keys, cube = freeze_cube(output['njets'], [{}, {'ctW': 1.}])  # cube of shape (npoints, nkeys, nbins)
+'''
+
+import functools
+import numpy as np
+import coffea.hist
+
+from topcoffea.modules.HistEFT import HistEFT
+
+def _hist_points(h, points):
+  ''' Array (npoints, nwc) with the points in the WCs of h, from a list of {WC name: value} (0 for the missing
+      WCs) or an array already in the order of the WCs of h '''
+  if isinstance(points, np.ndarray) or not all(isinstance(p, dict) for p in points):
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    if points.shape[1] != h._nwc:
+      raise ValueError("Wrong number of WC values.  Expecting {}, received {}".format(h._nwc, points.shape[1]))
+    return points
+  if not isinstance(h._wcnames, list) and any(points):
+    raise ValueError("The WCs of the histogram don't have names")
+  out = np.zeros((len(points), h._nwc))
+  for i, point in enumerate(points):
+    for name, value in point.items():
+      if name in h._wcnames: out[i, h._wcnames.index(name)] = value
+  return out
+
+def freeze_hist(h, points, sumw2=True):
+  ''' Plain coffea Hists with the contents of the HistEFT h at each point (a list with one Hist per point)
+      points: list of {WC name: value} (the WCs not given are set to 0), or array of shape (npoints, nwc)
+      sumw2: if True, also evaluate the sums of squared weights (when h has them)
+  '''
+  points = _hist_points(h, points)
+  sumw2 = sumw2 and h._sumw2 is not None
+  values = h.values_at(points, sumw2=sumw2, overflow='allnan')
+  out = [coffea.hist.Hist(h._label, *h.axes(), dtype=h._dtype) for _ in range(len(points))]
+  if sumw2:
+    for frozen in out: frozen._sumw2 = {}
+  for sparse_key, val in zip(h._sumw.keys(), values.values()):
+    sumw, sumw_sq = val if sumw2 else (val, None)
+    for i, frozen in enumerate(out):
+      frozen._sumw[sparse_key] = np.array(sumw[i], dtype=h._dtype)
+      if sumw2: frozen._sumw2[sparse_key] = np.array(sumw_sq[i], dtype=h._dtype)
+  return out
+
+def freeze_cube(h, points, sumw2=False, overflow='none'):
+  ''' Contents of the HistEFT h at each point as a single array, returns (keys, cube)
+      keys: list of the sparse identifiers (tuples of strings), in the order of the second axis of cube
+      cube: array of shape (npoints, nkeys, *dense_shape) (a tuple (sumw, sumw2) of those if sumw2 is True)
+      points: see freeze_hist(), overflow: see HistEFT.values()
+  '''
+  points = _hist_points(h, points)
+  values = h.values_at(points, sumw2=sumw2, overflow=overflow)
+  keys = [tuple(str(k) for k in key) for key in values.keys()]
+  dense_shape = tuple(len(ax.identifiers(overflow=overflow)) for ax in h.dense_axes())
+  def stack(arrays):
+    if not arrays: return np.zeros((len(points), 0, *dense_shape))
+    return np.stack([np.broadcast_to(arr, (len(points), *dense_shape)) for arr in arrays], axis=1)
+  if sumw2:
+    return keys, (stack([v[0] for v in values.values()]), stack([v[1] for v in values.values()]))
+  return keys, stack(list(values.values()))
+
+def _freeze_item(points, sumw2, item):
+  name, h = item
+  return name, freeze_hist(h, points, sumw2)
+
+def freeze(output, points, sumw2=True, pool=None):
+  ''' Freeze all the HistEFTs of an output (a mapping of names to histograms and other objects) at each point
+      Returns a list with one dict per point, where the HistEFTs are replaced by plain coffea Hists (the other
+      objects are kept as they are).  A single point (a dict {WC name: value}) gives a single dict.
+      points, sumw2: see freeze_hist()
+      pool: optional pool of processes used to evaluate the histograms in parallel
+  '''
+  single = isinstance(points, dict)
+  if single: points = [points]
+  mapper = map if pool is None else pool.map
+  items = [(name, obj) for name, obj in output.items() if isinstance(obj, HistEFT)]
+  frozen = dict(mapper(functools.partial(_freeze_item, points, sumw2), items))
+  out = [{name: (frozen[name][i] if name in frozen else obj) for name, obj in output.items()} for i in range(len(points))]
+  return out[0] if single else out
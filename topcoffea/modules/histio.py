@@ -0,0 +1,181 @@
+'''
+ Columnar on-disk format for the outputs of the processors (dicts of HistEFTs and coffea hists)
+
+ An output is saved as a directory, with one subdirectory per histogram holding:
+   - meta.pkl: the axes, options and sparse keys of the histogram (small)
+   - sumw_<n>.npy, sumw2_<n>.npy: the bin contents, as uncompressed numpy arrays.  All the bins with the
+     same shape (e.g. all the EFT bins of a histogram) are stacked in a single (nbins, *shape) array.
+ Anything else in the output (e.g. value accumulators) is pickled in other.pkl.
+
+ Since the arrays are not compressed, they are memory-mapped when loading: loading one histogram only
+ reads its own files, and selecting a few sparse keys only reads their rows.  The mapping is copy-on-write,
+ so the loaded histograms can be modified without touching the files.
+
+ Example:
+   save_hists(output, 'histos/plotsTopEFT')
+   h = load_hist('histos/plotsTopEFT', 'njets', keys=[('ttH', '2lss', 'base', 'ch+', 'nominal')])
+'''
+
+import os
+import pickle
+import numpy as np
+import coffea.hist
+
+from topcoffea.modules.HistEFT import HistEFT
+from topcoffea.modules.CoeffBlock import CoeffBlock
+
+def _save_storage(storage, path, prefix):
+  ''' Save the {sparse key: array} contents of a histogram, returns {sparse key: (block, row) or None} '''
+  groups = {}
+  for key, val in storage.items():
+    if val is None: continue
+    val = np.asarray(val)
+    groups.setdefault((val.shape, val.dtype.str), []).append(key)
+  refs = {key: None for key in storage.keys()}
+  for iblock, ((shape, dtype), keys) in enumerate(groups.items()):
+    block = np.lib.format.open_memmap(os.path.join(path, '%s_%i.npy' % (prefix, iblock)), mode='w+', dtype=dtype, shape=(len(keys), *shape))
+    for row, key in enumerate(keys):
+      block[row] = storage[key]
+      refs[key] = (iblock, row)
+    block.flush()
+    del block
+  return refs, len(groups)
+
+def save_hist(h, path):
+  ''' Save a single histogram (HistEFT or coffea Hist) in the directory path '''
+  os.makedirs(path, exist_ok=True)
+  meta = {
+    'class': type(h).__name__,
+    'label': h._label,
+    'axes': h._axes,
+    'dtype': h._dtype,
+  }
+  if isinstance(h, HistEFT):
+    h._fold_compensation()
+    meta['wcnames'] = h._wcnames
+    meta['options'] = {'contiguous': h._contiguous, 'eft_errors': h._eft_errors, 'compact': h._compact, 'linear': h._linear}
+    meta['wcs'] = np.asarray(h._wcs)
+    meta['active'] = {sparse_key: active for sparse_key, active in (h._active or {}).items()}
+  sparse_axes = h.sparse_axes()
+  def names(sparse_key):
+    return tuple(ax[k] for ax, k in zip(sparse_axes, sparse_key))
+  sumw_refs, meta['nsumw'] = _save_storage(h._sumw, path, 'sumw')
+  meta['keys'] = [names(sparse_key) for sparse_key in sumw_refs]
+  meta['sumw'] = list(sumw_refs.values())
+  if h._sumw2 is not None:
+    sumw2_refs, meta['nsumw2'] = _save_storage(h._sumw2, path, 'sumw2')
+    meta['sumw2'] = [sumw2_refs[sparse_key] for sparse_key in sumw_refs]
+  else:
+    meta['sumw2'] = None
+  if 'active' in meta:
+    meta['active'] = {names(sparse_key): active for sparse_key, active in meta['active'].items()}
+  with open(os.path.join(path, 'meta.pkl'), 'wb') as fout:
+    pickle.dump(meta, fout)
+
+def _load_meta(path):
+  with open(os.path.join(path, 'meta.pkl'), 'rb') as fin:
+    return pickle.load(fin)
+
+def _sparse_dim(meta):
+  return sum(1 for ax in meta['axes'] if isinstance(ax, coffea.hist.hist_tools.SparseAxis))
+
+def load_hist(path, name=None, keys=None, mmap=True):
+  ''' Load a histogram saved with save_hist() (or the histogram name of an output saved with save_hists())
+      keys: optional list of sparse keys (tuples with one identifier per sparse axis), to only load those bins
+      mmap: memory-map the arrays (copy-on-write) instead of reading them
+  '''
+  if name is not None:
+    with open(os.path.join(path, 'index.pkl'), 'rb') as fin:
+      path = os.path.join(path, pickle.load(fin)['hists'][name])
+  meta = _load_meta(path)
+  if meta['class'] == 'HistEFT':
+    h = HistEFT(meta['label'], meta['wcnames'], *meta['axes'], dtype=meta['dtype'], **meta['options'])
+    h._wcs = meta['wcs']
+  else:
+    h = coffea.hist.Hist(meta['label'], *meta['axes'], dtype=meta['dtype'])
+
+  # Sparse bins to load
+  entries = range(len(meta['keys']))
+  if keys is not None:
+    keys = set(tuple(k) if isinstance(k, (tuple, list)) else (k,) for k in keys)
+    wrong = [k for k in keys if len(k) != _sparse_dim(meta)]
+    if wrong:
+      raise ValueError("Sparse keys %r don't match the %i sparse axes of the histogram in %s" % (wrong, _sparse_dim(meta), path))
+    entries = [i for i in entries if meta['keys'][i] in keys]
+  sparse_axes = h.sparse_axes()
+  sparse_keys = {i: tuple(ax.index(k) for ax, k in zip(sparse_axes, meta['keys'][i])) for i in entries}
+
+  def load_storage(prefix, refs, nblocks, storage):
+    blocks = [np.load(os.path.join(path, '%s_%i.npy' % (prefix, i)), mmap_mode=('c' if mmap else None)) for i in range(nblocks)]
+    if isinstance(storage, CoeffBlock):
+      # The bins of one block with the shape and dtype of the coefficient rows (the one with the most selected bins)
+      # become the storage of the block directly, the bins of any other block are copied into it below
+      selected = {iblock: [i for i in entries if refs[i] is not None and refs[i][0] == iblock] for iblock in range(nblocks)}
+      matching = [iblock for iblock, block in enumerate(blocks) if block.shape[1:] == storage.row_shape and block.dtype == storage.dtype]
+      if matching:
+        iblock = max(matching, key=lambda iblock: len(selected[iblock]))
+        block, rows = blocks[iblock], selected[iblock]
+        array = block if len(rows) == len(block) else block[[refs[i][1] for i in rows]]
+        storage = CoeffBlock.from_array(array, [sparse_keys[i] for i in rows])
+    for i in entries:
+      if sparse_keys[i] in storage: continue
+      storage[sparse_keys[i]] = blocks[refs[i][0]][refs[i][1]] if refs[i] is not None else None
+    return storage
+
+  storage = h._new_storage(h._ncoeffs) if isinstance(h, HistEFT) else {}
+  h._sumw = load_storage('sumw', meta['sumw'], meta['nsumw'], storage)
+  if meta['sumw2'] is not None:
+    storage = h._new_storage(h._nerrcoeffs) if isinstance(h, HistEFT) else {}
+    h._sumw2 = load_storage('sumw2', meta['sumw2'], meta['nsumw2'], storage)
+  if isinstance(h, HistEFT):
+    h._active = {sparse_keys[i]: meta['active'][meta['keys'][i]] for i in entries if meta['keys'][i] in meta['active']}
+  return h
+
+def save_hists(output, path):
+  ''' Save an output (a mapping of names to histograms and other objects) in the directory path '''
+  os.makedirs(path, exist_ok=True)
+  index = {'hists': {}, 'other': []}
+  other = {}
+  for i, (name, obj) in enumerate(output.items()):
+    if isinstance(obj, coffea.hist.Hist):
+      index['hists'][name] = 'hist%i' % i
+      save_hist(obj, os.path.join(path, index['hists'][name]))
+    else:
+      index['other'].append(name)
+      other[name] = obj
+  with open(os.path.join(path, 'other.pkl'), 'wb') as fout:
+    pickle.dump(other, fout)
+  with open(os.path.join(path, 'index.pkl'), 'wb') as fout:
+    pickle.dump(index, fout)
+
+def load_hists(path, names=None, keys=None, mmap=True):
+  ''' Load an output saved with save_hists(), returns a dict
+      names: optional list of the names of the objects to load (by default, all of them)
+      keys: optional sparse keys to load (see load_hist()), either a mapping {name: list of keys} (the histograms
+            not in it are loaded in full), or a list of keys used for all the histograms with as many sparse axes
+            as the keys have identifiers (the others, e.g. a sum of weights histogram with fewer axes, are loaded
+            in full)
+      mmap: see load_hist()
+  '''
+  with open(os.path.join(path, 'index.pkl'), 'rb') as fin:
+    index = pickle.load(fin)
+  if keys is not None and not isinstance(keys, dict):
+    keys = [tuple(k) if isinstance(k, (tuple, list)) else (k,) for k in keys]
+  out = {}
+  for name in (names if names is not None else list(index['hists']) + index['other']):
+    if name in index['hists']:
+      hist_path = os.path.join(path, index['hists'][name])
+      hist_keys = keys
+      if isinstance(keys, dict):
+        hist_keys = keys.get(name)
+      elif keys is not None:
+        ndim = _sparse_dim(_load_meta(hist_path))
+        if not any(len(k) == ndim for k in keys): hist_keys = None
+        elif not all(len(k) == ndim for k in keys):
+          raise ValueError("Sparse keys with different numbers of identifiers, use a mapping {name: keys} instead")
+      out[name] = load_hist(hist_path, keys=hist_keys, mmap=mmap)
+  if any(name in index['other'] for name in (names if names is not None else index['other'])):
+    with open(os.path.join(path, 'other.pkl'), 'rb') as fin:
+      other = pickle.load(fin)
+    out.update({name: obj for name, obj in other.items() if names is None or name in names})
+  return out
@@ -0,0 +1,96 @@
+'''
+ Tools to merge the outputs of many chunks or jobs (dicts or accumulators of HistEFTs, coffea hists...)
+
+ The outputs are merged as a tree: groups of a few outputs are merged together, then groups of the results,
+ and so on.  Each merge is done in-place into the first output of the group, moving the bins of the others
+ instead of copying them (see HistEFT.add), and the groups of each level can be merged in parallel by
+ a pool of processes (anything with a map method, e.g. a concurrent.futures.ProcessPoolExecutor).
+
+ Example:
+   with concurrent.futures.ProcessPoolExecutor(8) as pool:
+     output = merge_files(['histos/job%i.pkl.gz'%i for i in range(100)], pool=pool)
+
+ When the merged output does not fit in memory, merge_to_scratch() merges the outputs one at a time into
+ HistEFTs that keep their coefficients in memory-mapped files (see the scratch option of HistEFT).
+'''
+
+import copy
+import gzip
+import pickle
+from collections.abc import MutableMapping
+
+from topcoffea.modules.HistEFT import HistEFT
+
+def merge_into(accum, other):
+  ''' Merge other into accum, in-place, and return accum (other should not be used afterwards) '''
+  if isinstance(accum, HistEFT):
+    return accum.add(other, move=True)
+  if isinstance(accum, MutableMapping):
+    for k, v in other.items():
+      if k in accum: accum[k] = merge_into(accum[k], v)
+      else:          accum[k] = v
+    return accum
+  accum += other
+  return accum
+
+def merge(outputs):
+  ''' Merge a list of outputs into the first one '''
+  outputs = [out for out in outputs if out is not None]
+  if len(outputs) == 0: return None
+  accum = outputs[0]
+  for other in outputs[1:]:
+    accum = merge_into(accum, other)
+  return accum
+
+def load_and_merge(paths):
+  ''' Load a list of pickled (gzipped) outputs and merge them '''
+  outputs = []
+  for path in paths:
+    with gzip.open(path) as fin:
+      outputs.append(pickle.load(fin))
+  return merge(outputs)
+
+def tree_reduce(outputs, pool=None, fanin=2, leaf=merge):
+  ''' Merge a list of outputs as a tree, returns the merged output
+      pool: optional pool of processes used to merge the groups of each level in parallel
+      fanin: number of outputs merged together in each group
+      leaf: function merging the groups at the first level (e.g. load_and_merge, for a list of paths)
+  '''
+  if fanin < 2: raise ValueError("fanin must be at least 2")
+  mapper = map if pool is None else pool.map
+  level, func = list(outputs), leaf
+  while len(level) > 1 or func is not merge:
+    groups = [level[i:i+fanin] for i in range(0, len(level), fanin)]
+    level, func = list(mapper(func, groups)), merge
+  return level[0] if level else None
+
+def merge_files(paths, pool=None, fanin=2):
+  ''' Load and merge a list of pickled (gzipped) outputs as a tree, each file is only read by the process merging it '''
+  return tree_reduce(paths, pool=pool, fanin=fanin, leaf=load_and_merge)
+
+def _scratch_like(obj, directory):
+  ''' Empty output like obj, where the HistEFTs keep their coefficients in memory-mapped files in directory '''
+  if isinstance(obj, HistEFT):
+    out = HistEFT(obj._label, obj._wcnames, *copy.deepcopy(obj._axes), dtype=obj._dtype, eft_errors=obj._eft_errors, compact=obj._compact, values_cache=obj._values_cache_size, linear=obj._linear, scratch=directory)
+    out._wcs = copy.deepcopy(obj._wcs)
+    return out
+  if isinstance(obj, MutableMapping):
+    out = obj.identity() if hasattr(obj, 'identity') else type(obj)()
+    for k, v in obj.items():
+      if isinstance(v, (HistEFT, MutableMapping)): out[k] = _scratch_like(v, directory)
+    return out
+  return obj.identity() if hasattr(obj, 'identity') else None
+
+def merge_to_scratch(outputs, directory):
+  ''' Merge a list of outputs (or of paths to pickled, gzipped, outputs) one at a time into an output where the
+      HistEFTs are stored in memory-mapped files in directory, so that only one of the outputs is in memory at once
+  '''
+  accum = None
+  for out in outputs:
+    if isinstance(out, str):
+      with gzip.open(out) as fin:
+        out = pickle.load(fin)
+    if out is None: continue
+    if accum is None: accum = _scratch_like(out, directory)
+    accum = merge_into(accum, out) if accum is not None else out
+  return accum
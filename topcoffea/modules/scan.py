@@ -0,0 +1,138 @@
+'''
+ Likelihood scans over a grid of WC values, for a set of HistEFTs (the signal regions) and observed counts
+
+ The expected yields of all the bins of all the histograms are linear in the monomials of the WCs, so for a
+ batch of points they are a single matrix product: (npoints, ncoeffs) @ (ncoeffs, nbins).  The binned Poisson
+ -2 log likelihood is then evaluated for the whole batch at once.  Large grids are split in chunks of points,
+ which can be spread over several processes.  The coefficients of the channels are sent to each process once,
+ when it starts, and the tasks only carry the points of their chunk.
+
+ Example:
+   axes, surface = scan_grid({'2lss': h_2lss, '3l': h_3l}, {'2lss': obs_2lss, '3l': obs_3l},
+                             {'ctW': (-4, 4), 'ctZ': (-4, 4)}, npoints=51)
+   ctW, q = axes[0], profile(surface, 0)   # 1D scan of ctW, profiled over ctZ
+'''
+
+import concurrent.futures
+import numpy as np
+import coffea.hist
+
+from topcoffea.modules.HistEFT import HistEFT
+
+class _Channel:
+  ''' Coefficients and observed counts of all the bins of a histogram, flattened '''
+
+  def __init__(self, h, observed, overflow='none'):
+    if isinstance(observed, coffea.hist.Hist): observed = observed.values(overflow=overflow)
+    coeffs = h._eval_coeffs(lambda c: c, overflow)
+    missing = [key for key in coeffs if key not in observed]
+    if missing:
+      raise KeyError("No observed counts for the bins %r" % missing)
+    self.wcnames = list(h._wcnames) if isinstance(h._wcnames, list) else None
+    self.helper = h._eft_helper
+    self.nwc = h._nwc
+    self.coeffs = np.concatenate([np.asarray(c, dtype=float).reshape(-1, c.shape[-1]) for c in coeffs.values()]).T
+    self.observed = np.concatenate([np.asarray(observed[key], dtype=float).ravel() for key in coeffs])
+
+  def nll(self, points):
+    ''' -2 log likelihood (up to a constant: 0 for a perfect fit) at each point, points of shape (npoints, nwc) '''
+    expected = self.helper.get_w_monomials(points) @ self.coeffs
+    n = self.observed
+    with np.errstate(divide='ignore', invalid='ignore'):
+      terms = np.where(n > 0, expected - n + n*np.log(np.where(n > 0, n, 1)/expected), expected)
+    terms = np.where(expected > 0, terms, np.where((expected == 0) & (n == 0), 0, np.inf))
+    return 2*np.sum(terms, axis=-1)
+
+def _channel_points(channel, points, wc_names, fixed):
+  ''' Points in the WCs of a channel, from points in wc_names (the other WCs set to the values in fixed, or 0) '''
+  if channel.wcnames is None:
+    if len(wc_names) != channel.nwc or fixed: raise ValueError("The WCs of the histograms don't have names")
+    return points
+  full = np.zeros((len(points), channel.nwc))
+  for name, value in (fixed or {}).items():
+    if name in channel.wcnames: full[:, channel.wcnames.index(name)] = value
+  for i, name in enumerate(wc_names):
+    if name in channel.wcnames: full[:, channel.wcnames.index(name)] = points[:, i]
+  return full
+
+def _scan_chunk(channels, wc_names, fixed, points):
+  return sum(channel.nll(_channel_points(channel, points, wc_names, fixed)) for channel in channels)
+
+# Channels and WCs of the scan in the worker processes, set once per process by _init_worker
+_worker_scan = None
+
+def _init_worker(channels, wc_names, fixed):
+  global _worker_scan
+  _worker_scan = (channels, wc_names, fixed)
+
+def _worker_chunk(points):
+  return _scan_chunk(*_worker_scan, points)
+
+def scan(hists, observed, points, wc_names=None, fixed=None, overflow='none', chunk_size=10000, processes=None, delta=True):
+  ''' Binned Poisson likelihood at a set of WC points, returns an array of shape (npoints,)
+      hists: HistEFT or mapping {name: HistEFT} with the expected yields (all the sparse and dense bins are used)
+      observed: observed counts, for each histogram either a coffea Hist with the same bins or a mapping
+                {(sparse identifier, ...): array} as returned by values()
+      points: array of shape (npoints, len(wc_names))
+      wc_names: names of the WCs in the columns of points (default: all the WCs of the first histogram)
+      fixed: optional mapping {WC name: value} for the WCs that are not scanned (0 by default)
+             All the WCs in wc_names and fixed must be WCs of every histogram
+      overflow: which under/overflow bins are included in the likelihood (see HistEFT.values)
+      chunk_size: number of points evaluated at once, bounds the memory to ~chunk_size*nbins floats
+      processes: optional number of processes evaluating the chunks in parallel
+      delta: if True, return -2 delta log likelihood with respect to the best point of the scan, else -2 log likelihood
+  '''
+  if isinstance(hists, HistEFT): hists, observed = {None: hists}, {None: observed}
+  channels = [_Channel(h, observed[name], overflow) for name, h in hists.items()]
+  if wc_names is None:
+    first = next(iter(hists.values()))
+    wc_names = list(first._wcnames) if isinstance(first._wcnames, list) else list(range(first._nwc))
+  points = np.atleast_2d(np.asarray(points, dtype=float))
+  if points.shape[1] != len(wc_names):
+    raise ValueError("Wrong number of WC values.  Expecting {}, received {}".format(len(wc_names), points.shape[1]))
+  for name, channel in zip(hists.keys(), channels):
+    if channel.wcnames is None: continue
+    unknown = [wc for wc in list(wc_names) + list(fixed or {}) if wc not in channel.wcnames]
+    if unknown:
+      raise ValueError("The WCs {} are not WCs of the histogram {}".format(unknown, name))
+
+  chunks = [points[i:i+chunk_size] for i in range(0, len(points), chunk_size)]
+  if processes is None or len(chunks) < 2:
+    nll = [_scan_chunk(channels, list(wc_names), fixed, chunk) for chunk in chunks]
+  else:
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(channels, list(wc_names), fixed)) as pool:
+      nll = list(pool.map(_worker_chunk, chunks))
+  nll = np.concatenate(nll) if chunks else np.zeros(0)
+  if delta and len(nll) > 0: nll = nll - np.min(nll)
+  return nll
+
+def make_grid(ranges, npoints=50):
+  ''' Regular grid over some WCs
+      ranges: mapping {WC name: (low, high)}, or {WC name: array of values}
+      npoints: number of values per WC (an int, or a mapping {WC name: int}) when a range is given
+      Returns (wc_names, axes, points) with the values along each WC and the (npoints, nwc) array of grid points
+  '''
+  wc_names, axes = list(ranges.keys()), []
+  for name in wc_names:
+    r = ranges[name]
+    n = npoints[name] if isinstance(npoints, dict) else npoints
+    axes.append(np.linspace(r[0], r[1], n) if len(r) == 2 and not isinstance(r, np.ndarray) else np.asarray(r, dtype=float))
+  mesh = np.meshgrid(*axes, indexing='ij')
+  points = np.stack([m.ravel() for m in mesh], axis=-1)
+  return wc_names, axes, points
+
+def scan_grid(hists, observed, ranges, npoints=50, **kwargs):
+  ''' Scan a regular grid (see make_grid), returns (axes, surface) with the -2 delta log likelihood on the grid,
+      surface[i, j, ...] corresponds to the values axes[0][i], axes[1][j]...
+      Other arguments are passed to scan()
+  '''
+  wc_names, axes, points = make_grid(ranges, npoints)
+  nll = scan(hists, observed, points, wc_names=wc_names, **kwargs)
+  return axes, nll.reshape([len(ax) for ax in axes])
+
+def profile(surface, keep):
+  ''' Profile a scan surface: minimize over all the WCs except the ones in keep (an index or tuple of indices) '''
+  keep = (keep,) if isinstance(keep, int) else tuple(keep)
+  other = tuple(i for i in range(surface.ndim) if i not in keep)
+  out = np.min(surface, axis=other) if other else surface
+  return out - np.min(out)
@@ -11,6 +11,8 @@ from coffea import hist, processor
 from coffea.hist import plot
 from cycler import cycler
 from topcoffea.plotter.OutText import OutText
+from topcoffea.modules.histio import load_hists
+from topcoffea.modules.HistEFTSet import HistEFTSet
 
 class plotter:
   def __init__(self, path, prDic={}, colors={}, bkgList=[], dataName='data', outpath='./temp/', lumi=59.7, sigList=[]):
@@ -48,11 +50,15 @@ class plotter:
     ''' Get a dictionary histoname : histogram '''
     if path != '': self.SetPath(path)
     self.hists = {}
-    with gzip.open(self.path) as fin:
-      hin = pickle.load(fin)
-      for k in hin.keys():
-        if k in self.hists: self.hists[k]+=hin[k]
-        else:               self.hists[k]=hin[k]
+    if os.path.isdir(self.path):
+      # Output saved in the columnar format (see topcoffea/modules/histio.py), the histograms are memory-mapped
+      self.hists = load_hists(self.path)
+    else:
+      with gzip.open(self.path) as fin:
+        hin = pickle.load(fin)
+        for k in hin.keys():
+          if k in self.hists: self.hists[k]+=hin[k]
+          else:               self.hists[k]=hin[k]
     self.GroupProcesses()
 
   def SetProcessDic(self, prdic, sampleLabel='sample', processLabel='process'):
@@ -72,10 +78,10 @@ class plotter:
   def GroupProcesses(self, prdic={}):
     ''' Move from grouping in samples to groping in processes '''
     if prdic != {}: self.SetProcessDic(prdic)
-    for k in self.hists.keys(): 
-      if len(self.hists[k].identifiers('sample')) == 0: continue
-      if k == 'SumOfEFTweights': continue
-      self.hists[k] = self.hists[k].group(hist.Cat(self.sampleLabel, self.sampleLabel), hist.Cat(self.processLabel, self.processLabel), self.prDic)
+    # All the histograms are grouped at once, the samples in each process are worked out a single time
+    names = [k for k in self.hists.keys() if k != 'SumOfEFTweights' and len(self.hists[k].identifiers('sample')) > 0]
+    grouped = HistEFTSet({k: self.hists[k] for k in names}).group(self.sampleLabel, hist.Cat(self.processLabel, self.processLabel), self.prDic)
+    for k in names: self.hists[k] = grouped[k]
 
   def SetBkgProcesses(self, bkglist=[]):
     ''' Set the list of background processes '''
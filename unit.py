@@ -1,7 +1,19 @@
+import os
+import pickle
+import tempfile
+import concurrent.futures
 import numpy as np
 import awkward as ak
 from coffea import hist
 from topcoffea.modules.HistEFT import HistEFT
+from topcoffea.modules.EFTHelper import EFTHelper
+from topcoffea.modules.EFTEvaluator import EFTEvaluator
+from topcoffea.modules.HistEFTSet import HistEFTSet
+from topcoffea.modules.CoeffBlock import CoeffBlock
+from topcoffea.modules.merging import tree_reduce, merge_to_scratch
+from topcoffea.modules.histio import save_hist, save_hists, load_hists, load_hist
+from topcoffea.modules.scan import scan_grid, profile
+from topcoffea.modules.freeze import freeze, freeze_cube
 from topcoffea.modules.WCPoint import WCPoint
 from topcoffea.modules.WCFit import WCFit
 
@@ -499,6 +511,1245 @@ def test_histeft():
     print(f'Passed Checks: {all_chks}/{units}')
     return (all_chks == units)
 
+def test_histeft_contiguous():
+    all_chks,units = [0]*2
+    tolerance = 1e-8
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.75,-1.5])
+
+    print('Running unit tests for HistEFT contiguous storage')
+
+    # Fill the same events in a histogram with the default storage and one with contiguous storage
+    rng = np.random.default_rng(42)
+    h_dict = HistEFT("h_dict", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin("n",  "", 4, 0, 4))
+    h_cont = HistEFT("h_cont", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin("n",  "", 4, 0, 4), contiguous=True)
+    for sample in ['s1','s2']:
+        for channel in ['c1','c2','c3']:
+            vals = rng.uniform(0,4,size=20)
+            coeffs = rng.normal(size=(20,n_coeffs))
+            weights = rng.uniform(0.5,1.5,size=20)
+            h_dict.fill(n=vals, sample=sample, channel=channel, weight=weights, eft_coeff=coeffs.copy())
+            h_cont.fill(n=vals, sample=sample, channel=channel, weight=weights, eft_coeff=coeffs.copy())
+    h_dict.set_wilson_coefficients(chk_arr)
+    h_cont.set_wilson_coefficients(chk_arr)
+
+    def max_diff(h1, h2):
+        v1, v2 = h1.values(), h2.values()
+        if set(v1.keys()) != set(v2.keys()): return np.inf
+        return max(np.max(np.abs(v1[k] - v2[k])) for k in v1.keys())
+
+    checks = [
+        ('fill', lambda h: h),
+        ('add', lambda h: h.copy().add(h)),
+        ('sum', lambda h: h.sum('channel')),
+        ('integrate', lambda h: h.integrate('channel', ['c1','c3'])),
+    ]
+    for name, op in checks:
+        diff = max_diff(op(h_dict), op(h_cont))
+        unit_chk = (diff < tolerance)
+        all_chks += unit_chk
+        units += 1
+
+        chk_str = 'Passed' if unit_chk else 'Failed'
+        print(f'--- UNIT {units} ---')
+        print('operation    : ', name)
+        print('difference   : ', diff)
+        print('tolerance    : ', tolerance)
+        print('test: ', chk_str)
+        print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_values_at():
+    all_chks,units = [0]*2
+    tolerance = 1e-8
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+
+    print('Running unit tests for HistEFT.values_at()')
+
+    rng = np.random.default_rng(7)
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    coeffs = rng.normal(size=(30,n_coeffs))
+    h.fill(n=rng.uniform(0,4,size=30), sample='s1', eft_coeff=coeffs, eft_err_coeff=h._eft_helper.calc_w2_coeffs(coeffs))
+
+    # Compare the batched evaluation with evaluating one point at a time
+    points = rng.normal(size=(5,len(wc_names)))
+    batched = h.values_at(points, sumw2=True)[('s1',)]
+    diff = 0.0
+    for i, pt in enumerate(points):
+        h.set_wilson_coefficients(pt)
+        sumw, sumw2 = h.values(sumw2=True)[('s1',)]
+        diff = max(diff, np.max(np.abs(batched[0][i] - sumw)), np.max(np.abs(batched[1][i] - sumw2)))
+
+    unit_chk = (diff < tolerance)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('npoints      : ', len(points))
+    print('difference   : ', diff)
+    print('tolerance    : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_fill_categories():
+    all_chks,units = [0]*2
+    tolerance = 1e-8
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.75,-1.5])
+
+    print('Running unit tests for HistEFT.fill_categories()')
+
+    rng = np.random.default_rng(11)
+    nevents = 100
+    vals = rng.uniform(0,4,size=nevents)
+    coeffs = rng.normal(size=(nevents,n_coeffs))
+    weights = rng.uniform(0.5,1.5,size=nevents)
+    categories = [{'sample':'s1', 'channel':ch} for ch in ['c1','c2','c3']]
+    masks = rng.random((nevents,len(categories))) < 0.5
+
+    # Filling the categories one by one...
+    h_loop = HistEFT("h_loop", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin("n",  "", 4, 0, 4))
+    for i, cat in enumerate(categories):
+        h_loop.fill(n=vals[masks[:,i]], weight=weights[masks[:,i]], eft_coeff=coeffs[masks[:,i]], **cat)
+
+    # ...should give the same as filling all of them at once
+    h_cats = HistEFT("h_cats", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin("n",  "", 4, 0, 4))
+    h_cats.fill_categories(categories, masks, n=vals, weight=weights, eft_coeff=coeffs)
+
+    h_loop.set_wilson_coefficients(chk_arr)
+    h_cats.set_wilson_coefficients(chk_arr)
+    v_loop, v_cats = h_loop.values(), h_cats.values()
+    diff = max(np.max(np.abs(v_loop[k] - v_cats[k])) for k in v_loop.keys())
+
+    unit_chk = (diff < tolerance)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('categories   : ', len(categories))
+    print('difference   : ', diff)
+    print('tolerance    : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # A call that fails should leave the histogram as it was
+    keys_before = set(h_cats._sumw.keys())
+    new_categories = [{'sample':'s2', 'channel':'c1'}, {'sample':'s1', 'channel':'c1'}]
+    try:
+        h_cats.fill_categories(new_categories, masks[:,:2], n=vals, weight=weights, eft_coeff=coeffs, eft_err_coeff=np.ones((nevents,h_cats._nerrcoeffs)))
+        raised = False
+    except ValueError:
+        raised = True
+    # Out of range category codes and per-category weights of the wrong shape
+    bad_calls = [
+        lambda h: h.fill_categories(new_categories, np.full(nevents, 12), n=vals, eft_coeff=coeffs),
+        lambda h: h.fill_categories(new_categories, np.full(nevents, 12), n=vals),
+        lambda h: h.fill_categories(new_categories, masks[:,:2], n=vals, weight=np.ones((nevents,3)), eft_coeff=coeffs),
+    ]
+    for call in bad_calls:
+        try:
+            call(h_cats)
+            raised = False
+        except ValueError:
+            pass
+    keys_after = set(h_cats._sumw.keys())
+
+    unit_chk = raised and (keys_after == keys_before)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 2 ---')
+    print('raised       : ', raised)
+    print('keys before  : ', len(keys_before))
+    print('keys after   : ', len(keys_after))
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_eft_errors():
+    all_chks,units = [0]*2
+    tolerance = 1e-8
+
+    wc_names = ['ctG','ctZ','ctW']
+    n_coeffs = 10
+    chk_arr = np.array([0.5,-1.0,2.0])
+
+    print('Running unit tests for HistEFT eft_errors mode')
+
+    rng = np.random.default_rng(13)
+    nevents = 200
+    vals = rng.uniform(0,4,size=nevents)
+    coeffs = rng.normal(size=(nevents,n_coeffs))
+    weights = rng.uniform(0.5,1.5,size=nevents)
+
+    # Passing the w**2 coefficients explicitly...
+    h_expl = HistEFT("h_expl", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    h_expl.fill(sample='s1', n=vals, weight=weights, eft_coeff=coeffs, eft_err_coeff=EFTHelper(wc_names).calc_w2_coeffs(coeffs))
+
+    # ...should give the same errors as letting the histogram work them out
+    h_gram = HistEFT("h_gram", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), eft_errors=True)
+    h_gram.fill(sample='s1', n=vals, weight=weights, eft_coeff=coeffs)
+
+    h_expl.set_wilson_coefficients(chk_arr)
+    h_gram.set_wilson_coefficients(chk_arr)
+    v_expl, v_gram = h_expl.values(sumw2=True), h_gram.values(sumw2=True)
+    diff = max(np.max(np.abs(v_expl[k][1] - v_gram[k][1])/v_expl[k][1]) for k in v_expl.keys())
+
+    unit_chk = (diff < tolerance)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('rel. difference : ', diff)
+    print('tolerance       : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_float32():
+    all_chks,units = [0]*2
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for single precision HistEFT storage')
+
+    # Sum many small histograms (as when merging the outputs of many chunks), in double and single precision
+    def merged(dtype, nchunks=2000, nevents=20):
+        rng = np.random.default_rng(17)
+        h_tot = HistEFT("h_tot", wc_names, hist.Bin("n",  "", 4, 0, 4), dtype=dtype)
+        for i in range(nchunks):
+            h = h_tot.identity()
+            h.fill(n=rng.uniform(0,4,size=nevents), weight=rng.uniform(size=nevents), eft_coeff=rng.normal(1,0.3,size=(nevents,n_coeffs)))
+            h_tot += h
+        h_tot.set_wilson_coefficients(chk_arr)
+        return h_tot
+
+    # The merged single precision histogram should store single precision coefficients, but
+    # thanks to the compensated sums in add() agree with the double precision one well within
+    # the single precision rounding error of one sum (~6e-8)
+    h_64, h_32 = merged(np.float64), merged(np.float32)
+    v_64, v_32 = h_64.values()[()], h_32.values()[()]
+    diff = np.max(np.abs(v_32 - v_64)/np.abs(v_64))
+    tolerance = 1e-7
+
+    unit_chk = (diff < tolerance) and (h_32._sumw[()].dtype == np.float32)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('storage dtype   : ', h_32._sumw[()].dtype)
+    print('rel. difference : ', diff)
+    print('tolerance       : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_compact():
+    all_chks,units = [0]*2
+    tolerance = 1e-8
+
+    wc_names = ['ctG','ctZ','ctW','ctp']
+    chk_arr = np.array([0.5,-1.0,2.0,1.5])
+    helper = EFTHelper(wc_names)
+
+    print('Running unit tests for compact HistEFT storage')
+
+    # Events that only depend on some of the WCs
+    def coeffs(rng, nevents, active):
+        w_idx, _ = helper.get_sub_indices(active)
+        out = np.zeros((nevents,helper.get_w_coeffs()))
+        out[:,w_idx] = rng.normal(size=(nevents,len(w_idx)))
+        return out
+
+    def filled(compact):
+        rng = np.random.default_rng(19)
+        h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), compact=compact, eft_errors=True)
+        for sample, active in [('s1',[1]), ('s2',[0,2]), ('s2',[3])]:
+            h.fill(sample=sample, n=rng.uniform(0,4,size=50), weight=rng.uniform(size=50), eft_coeff=coeffs(rng,50,active))
+        h_other = h.identity()
+        h_other.fill(sample='s1', n=rng.uniform(0,4,size=50), weight=rng.uniform(size=50), eft_coeff=coeffs(rng,50,[2]))
+        h += h_other
+        h.set_wilson_coefficients(chk_arr)
+        return h
+
+    # The compact histogram should only store the coefficients of the WCs each bin depends on,
+    # but give the same values (and errors) as the regular one, also after summing bins together
+    h_full, h_compact = filled(False), filled(True)
+    diff = 0
+    for h_a, h_b in [(h_full, h_compact), (h_full.sum('sample'), h_compact.sum('sample'))]:
+        v_a, v_b = h_a.values(sumw2=True), h_b.values(sumw2=True)
+        diff = max(diff, max(np.max(np.abs(v_a[k][i] - v_b[k][i])/np.abs(v_a[k][i]).max()) for k in v_a.keys() for i in range(2)))
+    active = {str(k[0]): a for k, a in h_compact._active.items()}
+
+    unit_chk = (diff < tolerance) and active == {'s1':(1,2), 's2':(0,2,3)}
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('active WCs      : ', active)
+    print('rel. difference : ', diff)
+    print('tolerance       : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_merging():
+    all_chks,units = [0]*2
+    tolerance = 1e-8
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for merging HistEFTs')
+
+    def chunk(i):
+        rng = np.random.default_rng(100+i)
+        h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+        h.fill(sample='s%i'%(i%3), n=rng.uniform(0,4,size=20), weight=rng.uniform(size=20), eft_coeff=rng.normal(size=(20,n_coeffs)))
+        return {'h': h}
+
+    # Merging the chunks as a tree (moving the bins around) should give the same as adding them one by one
+    h_seq = chunk(0)['h']
+    for i in range(1,10): h_seq += chunk(i)['h']
+    h_tree = tree_reduce([chunk(i) for i in range(10)], fanin=3)['h']
+
+    h_seq.set_wilson_coefficients(chk_arr)
+    h_tree.set_wilson_coefficients(chk_arr)
+    v_seq, v_tree = h_seq.values(sumw2=True), h_tree.values(sumw2=True)
+    diff = max(np.max(np.abs(v_seq[k][i] - v_tree[k][i])) for k in v_seq.keys() for i in range(2))
+
+    unit_chk = (diff < tolerance) and (set(v_seq.keys()) == set(v_tree.keys()))
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference   : ', diff)
+    print('tolerance    : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_histio():
+    all_chks,units = [0]*2
+    tolerance = 1e-12
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for saving/loading HistEFTs in the columnar format')
+
+    rng = np.random.default_rng(7)
+    output = {'njets': HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), contiguous=True, eft_errors=True),
+              'nevents': 123}
+    for s in ['s0','s1','s2']:
+        output['njets'].fill(sample=s, n=rng.uniform(0,4,size=20), weight=rng.uniform(size=20), eft_coeff=rng.normal(size=(20,n_coeffs)))
+    output['njets'].set_wilson_coefficients(chk_arr)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        save_hists(output, tmpdir)
+        loaded = load_hists(tmpdir)
+        h_one = load_hist(tmpdir, 'njets', keys=[('s1',)])
+
+        v_ref, v_load = output['njets'].values(sumw2=True), loaded['njets'].values(sumw2=True)
+        diff = max(np.max(np.abs(v_ref[k][i] - v_load[k][i])) for k in v_ref.keys() for i in range(2))
+        v_one = h_one.values(sumw2=True)
+        diff_one = max(np.max(np.abs(v_ref[k][i] - v_one[k][i])) for k in v_one.keys() for i in range(2))
+
+    unit_chk = (diff < tolerance) and (diff_one < tolerance) and (set(v_ref.keys()) == set(v_load.keys())) and (list(v_one.keys()) == [('s1',)]) and (loaded['nevents'] == 123)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference (all bins)     : ', diff)
+    print('difference (one sparse key): ', diff_one)
+    print('tolerance                 : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # Histograms with different sparse axes: the keys only select the bins of the ones they match
+    output['sow'] = HistEFT("h", wc_names, hist.Bin("sow",  "", 1, 0, 2))
+    output['sow'].fill(sow=np.ones(5), eft_coeff=rng.normal(size=(5,n_coeffs)))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        save_hists(output, tmpdir)
+        loaded = load_hists(tmpdir, keys=[('s1',)])
+        by_name = load_hists(tmpdir, keys={'njets': [('s2',)]})
+        try:
+            load_hist(tmpdir, 'sow', keys=[('s1',)])
+            raised = False
+        except ValueError:
+            raised = True
+
+    unit_chk = (list(loaded['njets'].values().keys()) == [('s1',)]) and (list(loaded['sow'].values().keys()) == [()])
+    unit_chk = unit_chk and (list(by_name['njets'].values().keys()) == [('s2',)]) and (list(by_name['sow'].values().keys()) == [()]) and raised
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 2 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # Rows of the same shape saved in several blocks (here with different dtypes) are loaded into a contiguous histogram
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    for s in ['s0','s1','s2']:
+        h.fill(sample=s, n=rng.uniform(0,4,size=20), eft_coeff=rng.normal(size=(20,n_coeffs)))
+    key_s2 = list(h._sumw.keys())[-1]
+    h._sumw[key_s2] = h._sumw[key_s2].astype(np.float32)
+    h.set_wilson_coefficients(chk_arr)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        save_hist(h, tmpdir)
+        with open(os.path.join(tmpdir, 'meta.pkl'), 'rb') as fin: meta = pickle.load(fin)
+        meta['options']['contiguous'] = True
+        with open(os.path.join(tmpdir, 'meta.pkl'), 'wb') as fout: pickle.dump(meta, fout)
+        loaded = load_hist(tmpdir)
+        loaded.set_wilson_coefficients(chk_arr)
+        v_ref, v_load = h.values(), loaded.values()
+        diff = max(np.max(np.abs(v_ref[k] - v_load[k])) for k in v_ref.keys())
+        same_dtype = (loaded._sumw.dtype == h._dtype) and (loaded._sumw.array.dtype == h._dtype) and (meta['nsumw'] == 2)
+
+    unit_chk = (diff < tolerance) and (set(v_ref.keys()) == set(v_load.keys())) and same_dtype
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 3 ---')
+    print('difference    : ', diff)
+    print('same dtype    : ', same_dtype)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_values_cache():
+    all_chks,units = [0]*2
+    tolerance = 1e-12
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for the HistEFT values() cache')
+
+    rng = np.random.default_rng(11)
+    def fill(h):
+        h.fill(sample='s0', n=rng.uniform(0,4,size=20), weight=rng.uniform(size=20), eft_coeff=rng.normal(size=(20,n_coeffs)))
+
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), values_cache=2)
+    h_ref = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), values_cache=0)
+    for i in range(2):
+        state = rng.bit_generator.state
+        fill(h)
+        rng.bit_generator.state = state
+        fill(h_ref)
+        for wcs in [chk_arr, 2*chk_arr, 3*chk_arr, chk_arr]:
+            h.set_wilson_coefficients(wcs)
+            h_ref.set_wilson_coefficients(wcs)
+            v, v_ref = h.values(sumw2=True), h_ref.values(sumw2=True)
+            diff = max(np.max(np.abs(v[k][j] - v_ref[k][j])) for k in v_ref.keys() for j in range(2))
+            unit_chk = (diff < tolerance) and (len(h._values_cache) <= 2)
+            all_chks += unit_chk
+            units += 1
+
+    # Derived histograms don't see the cached values of the original one
+    h_sum = h.sum('sample')
+    diff_sum = np.max(np.abs(h_sum.values()[()] - h_ref.sum('sample').values()[()]))
+    unit_chk = (diff_sum < tolerance) and (len(h_sum._values_cache) == 1)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference (sum): ', diff_sum)
+    print('tolerance       : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # The cached values can be modified in place without changing the cache, and have the same types as without it
+    h.set_wilson_coefficients(chk_arr)
+    v = h.values()
+    v[('s0',)] *= 0
+    diff_copy = np.max(np.abs(h.values()[('s0',)] - h_ref.values()[('s0',)]))
+    h_0d = HistEFT("h_0d", wc_names, hist.Cat("sample", "sample"), values_cache=2)
+    h_0d.fill(sample='s0', weight=np.ones(3), eft_coeff=np.ones((3,n_coeffs)))
+    h_0d.fill(sample='s1', weight=np.ones(3))
+    h_0d_ref = h_0d.copy()
+    h_0d_ref._values_cache_size = 0
+    same_types = all(type(h_0d.values()[k]) is type(w) for k, w in h_0d_ref.values().items())
+
+    unit_chk = (diff_copy < tolerance) and same_types
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 2 ---')
+    print('difference (copy): ', diff_copy)
+    print('same types       : ', same_types)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_rebin():
+    all_chks,units = [0]*2
+    tolerance = 1e-12
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for rebinning HistEFTs')
+
+    rng = np.random.default_rng(13)
+    for contiguous in [False, True]:
+        h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 8, 0, 8), hist.Bin("b",  "", 2, 0, 2), contiguous=contiguous, eft_errors=True)
+        for s in ['s0','s1']:
+            h.fill(sample=s, n=rng.uniform(-1,9,size=50), b=rng.uniform(0,2,size=50), weight=rng.uniform(size=50), eft_coeff=rng.normal(size=(50,n_coeffs)))
+        h.set_wilson_coefficients(chk_arr)
+
+        # Rebinning by 2 sums pairs of bins, the under/overflow bins are kept as they are
+        v = h.values(sumw2=True, overflow='all')
+        for new_axis in [2, hist.Bin("n", "", 4, 0, 8)]:
+            v_new = h.rebin('n', new_axis).values(sumw2=True, overflow='all')
+            diff = 0
+            for k in v.keys():
+                for i in range(2):
+                    expected = np.concatenate([v[k][i][:1], v[k][i][1:9].reshape(4,2,-1).sum(axis=1), v[k][i][9:]])
+                    diff = max(diff, np.max(np.abs(v_new[k][i] - expected)))
+            unit_chk = (diff < tolerance)
+            all_chks += unit_chk
+            units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference: ', diff)
+    print('tolerance : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_group():
+    all_chks,units = [0]*2
+    tolerance = 1e-12
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for grouping HistEFTs')
+
+    rng = np.random.default_rng(17)
+    mapping = {'A': ['s0','s1'], 'B': ['s1','s2'], 'C': 's*'}
+    for contiguous in [False, True]:
+        h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin("n",  "", 4, 0, 4), contiguous=contiguous, eft_errors=True)
+        for s in ['s0','s1','s2']:
+            for ch in ['2l','3l']:
+                h.fill(sample=s, channel=ch, n=rng.uniform(0,4,size=20), weight=rng.uniform(size=20), eft_coeff=rng.normal(size=(20,n_coeffs)))
+        h.set_wilson_coefficients(chk_arr)
+
+        # Each process should be the same as integrating its samples, a sample can go to several processes
+        hg = h.group('sample', hist.Cat('process', 'process'), mapping)
+        v = hg.values(sumw2=True)
+        diff = 0
+        for proc, samples in mapping.items():
+            v_ref = h.integrate('sample', samples).values(sumw2=True)
+            for (ch,), (sumw, sumw2) in v_ref.items():
+                diff = max(diff, np.max(np.abs(v[(proc, ch)][0] - sumw)), np.max(np.abs(v[(proc, ch)][1] - sumw2)))
+        unit_chk = (diff < tolerance) and (len(v) == 6)
+        all_chks += unit_chk
+        units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference: ', diff)
+    print('tolerance : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_views():
+    all_chks,units = [0]*2
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for HistEFT views')
+
+    rng = np.random.default_rng(19)
+    for contiguous in [False, True]:
+        h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), contiguous=contiguous)
+        for s in ['s0','s1','s2']:
+            h.fill(sample=s, n=rng.uniform(0,4,size=20), eft_coeff=rng.normal(size=(20,n_coeffs)))
+        h.set_wilson_coefficients(chk_arr)
+        v_ref = {k: v.copy() for k, v in h.values().items()}
+
+        # Selecting sparse bins shares the arrays, filling either histogram should not change the other one
+        hv = h[['s0','s1'], :]
+        hv.set_wilson_coefficients(chk_arr)
+        shared = (hv._sumw._array is h._sumw._array) if contiguous else all(hv._sumw[k] is h._sumw[k] for k in hv._sumw)
+        hv.fill(sample='s0', n=np.ones(5), eft_coeff=np.ones((5,n_coeffs)))
+        h2 = h['s2', :]
+        h.fill(sample='s2', n=np.ones(5), eft_coeff=np.ones((5,n_coeffs)))
+        h2.set_wilson_coefficients(chk_arr)
+
+        unit_chk = shared and (list(hv.values().keys()) == [('s0',), ('s1',)])
+        unit_chk = unit_chk and all(np.array_equal(h.values()[k], v_ref[k]) for k in [('s0',), ('s1',)])
+        unit_chk = unit_chk and not np.array_equal(hv.values()[('s0',)], v_ref[('s0',)])
+        unit_chk = unit_chk and np.array_equal(h2.values()[('s2',)], v_ref[('s2',)])
+        all_chks += unit_chk
+        units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # Once the arrays have been copied, or the views are gone, the histograms are filled in place again
+    def fill_in_place(h):
+        key = next(iter(h._sumw.keys()))
+        arr = h._sumw[key]
+        h.fill(sample='s0', n=np.ones(5), eft_coeff=np.ones((5,n_coeffs)))
+        return h._sumw[key] is arr
+
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    h.fill(sample='s0', n=np.ones(5), eft_coeff=np.ones((5,n_coeffs)))
+    hv = h[['s0'], :]
+    copied = not fill_in_place(h)
+    in_place = fill_in_place(h) and fill_in_place(hv)
+    hv2 = h[['s0'], :]
+    del hv2
+    in_place_del = fill_in_place(h)
+
+    unit_chk = copied and in_place and in_place_del
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 2 ---')
+    print('copied once      : ', copied)
+    print('in place after   : ', in_place)
+    print('view deleted     : ', in_place_del)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_scale_dense():
+    all_chks,units = [0]*2
+    tolerance = 1e-12
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for scaling HistEFTs along a dense axis')
+
+    rng = np.random.default_rng(23)
+    kfactors = np.array([1.1, 1.2, 0.9, 0.8])
+    for contiguous in [False, True]:
+        h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), contiguous=contiguous, eft_errors=True)
+        for s in ['s0','s1']:
+            h.fill(sample=s, n=rng.uniform(-1,5,size=30), weight=rng.uniform(size=30), eft_coeff=rng.normal(size=(30,n_coeffs)))
+        h.set_wilson_coefficients(chk_arr)
+        v_ref = {k: (w.copy(), w2.copy()) for k, (w, w2) in h.values(sumw2=True, overflow='allnan').items()}
+
+        # The under/overflow bins are not scaled when only the regular bins are given
+        h.scale(kfactors, axis='n')
+        factors = np.r_[1, kfactors, 1, 1]
+        diff = max(max(np.max(np.abs(w - v_ref[k][0]*factors)), np.max(np.abs(w2 - v_ref[k][1]*factors**2))) for k, (w, w2) in h.values(sumw2=True, overflow='allnan').items())
+        unit_chk = (diff < tolerance)
+        all_chks += unit_chk
+        units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference: ', diff)
+    print('tolerance : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_derivatives():
+    all_chks,units = [0]*2
+    tolerance = 1e-6
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,1.0])
+
+    print('Running unit tests for the derivatives of HistEFTs')
+
+    rng = np.random.default_rng(29)
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    h.fill(sample='s0', n=rng.uniform(0,4,size=30), weight=rng.uniform(size=30), eft_coeff=rng.normal(size=(30,n_coeffs)))
+    grad = h.gradient_at(chk_arr)[('s0',)]
+    hess = h.hessian_at(chk_arr)[('s0',)]
+    form = h.quadratic_forms()[('s0',)]
+
+    # Compare with finite differences of values()
+    eps = 1e-4
+    def vals(point):
+        h.set_wilson_coefficients(point)
+        return h.values()[('s0',)]
+    grad_fd = np.stack([(vals(chk_arr+eps*np.eye(2)[i]) - vals(chk_arr-eps*np.eye(2)[i]))/(2*eps) for i in range(2)], axis=-1)
+    diff_grad = np.max(np.abs(grad - grad_fd))
+    x = np.concatenate(([1], chk_arr))
+    diff_form = np.max(np.abs(form @ x @ x - vals(chk_arr)))
+    diff_hess = np.max(np.abs(hess - 2*form[:,1:,1:]))
+
+    unit_chk = (diff_grad < tolerance) and (diff_form < tolerance) and (diff_hess < tolerance)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference (gradient)      : ', diff_grad)
+    print('difference (quadratic form): ', diff_form)
+    print('difference (hessian)       : ', diff_hess)
+    print('tolerance                  : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_scan():
+    all_chks,units = [0]*2
+
+    wc_names = ['ctG','ctZ']
+    n_coeffs = 6
+    chk_arr = np.array([0.5,-0.25])
+
+    print('Running unit tests for WC likelihood scans')
+
+    # Asimov data at chk_arr: the scan should find its minimum there
+    rng = np.random.default_rng(31)
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    eft_coeff = np.abs(rng.normal(size=(100,n_coeffs)))
+    eft_coeff[:,0] += 3
+    h.fill(sample='s0', n=rng.uniform(0,4,size=100), eft_coeff=eft_coeff)
+    h.set_wilson_coefficients(chk_arr)
+    observed = {k: np.array(v) for k, v in h.values().items()}
+
+    axes, surface = scan_grid(h, observed, {'ctG': (-1,1), 'ctZ': (-1,1)}, npoints=9)
+    best = tuple(ax[i] for ax, i in zip(axes, np.unravel_index(np.argmin(surface), surface.shape)))
+    best_1d = axes[0][np.argmin(profile(surface, 0))]
+
+    unit_chk = np.allclose(best, chk_arr) and np.isclose(best_1d, chk_arr[0]) and (surface.shape == (9,9))
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 1 ---')
+    print('best point: ', best)
+    print('expected  : ', chk_arr)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # Same scan over several processes, and WCs the histogram doesn't have are an error
+    axes_mp, surface_mp = scan_grid(h, observed, {'ctG': (-1,1), 'ctZ': (-1,1)}, npoints=9, chunk_size=20, processes=2)
+    try:
+        scan_grid(h, observed, {'ctG': (-1,1), 'ctW': (-1,1)}, npoints=3)
+        raised = False
+    except ValueError:
+        raised = True
+
+    unit_chk = np.allclose(surface_mp, surface) and raised
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 2 ---')
+    print('same with processes: ', np.allclose(surface_mp, surface))
+    print('unknown WC raised  : ', raised)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_eft_evaluator():
+    all_chks,units = [0]*2
+    tolerance = 1e-10
+
+    wc_names = ['ctG','ctZ','ctW']
+    n_coeffs = 10
+
+    print('Running unit tests for the incremental EFT evaluator')
+
+    rng = np.random.default_rng(37)
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    for s in ['s0','s1']:
+        h.fill(sample=s, n=rng.uniform(-1,5,size=30), eft_coeff=rng.normal(size=(30,n_coeffs)))
+
+    # Move one WC at a time, the bins should match a full evaluation at the same point
+    ev = EFTEvaluator(h)
+    point = np.zeros(3)
+    for i in range(20):
+        k = rng.integers(3)
+        point[k] = rng.uniform(-3,3)
+        ev.set_wc(wc_names[k], point[k])
+        h.set_wilson_coefficients(point)
+        v, v_ref = ev.values(overflow='all'), h.values(overflow='all')
+        diff = max(np.max(np.abs(v[key] - v_ref[key])) for key in v_ref)
+        unit_chk = (diff < tolerance)
+        all_chks += unit_chk
+        units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('difference: ', diff)
+    print('tolerance : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # The bins are evaluated from scratch periodically, and after a large step
+    for i in range(250):
+        k = rng.integers(3)
+        point[k] = rng.uniform(-1,1)
+        ev.set_wc(wc_names[k], point[k])
+    periodic = ev._updates < EFTEvaluator._max_updates
+    ev.set_wc(wc_names[0], 1e3)
+    point[0] = 1e3
+    large_step = (ev._updates == 0)
+    h.set_wilson_coefficients(point)
+    v, v_ref = ev.values(overflow='all'), h.values(overflow='all')
+    diff = max(np.max(np.abs(v[key] - v_ref[key])/np.maximum(1, np.abs(v_ref[key]))) for key in v_ref)
+
+    unit_chk = periodic and large_step and (diff < tolerance)
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 2 ---')
+    print('periodic  : ', periodic)
+    print('large step: ', large_step)
+    print('difference: ', diff)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    # hist() carries the sums of squared weights of the HistEFT
+    h_err = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), eft_errors=True)
+    for s in ['s0','s1']:
+        h_err.fill(sample=s, n=rng.uniform(-1,5,size=30), weight=rng.uniform(size=30), eft_coeff=rng.normal(size=(30,n_coeffs)))
+    ev = EFTEvaluator(h_err)
+    ev.set_wc('ctZ', 0.7)
+    h_err.set_wilson_coefficients(np.array([0., 0.7, 0.]))
+    v, v_ref = ev.hist().values(sumw2=True, overflow='all'), h_err.values(sumw2=True, overflow='all')
+    diff = max(np.max(np.abs(v[key][j] - v_ref[key][j])) for key in v_ref for j in range(2))
+    no_sumw2 = ev.hist(sumw2=False)._sumw2 is None
+
+    # The values are copies: later updates don't change them and changing them doesn't change the evaluator
+    v_before = ev.values(overflow='all')
+    kept = {key: arr.copy() for key, arr in v_before.items()}
+    ev.set_wc('ctG', 0.3)
+    for arr in v_before.values(): arr[:] = 0
+    h_err.set_wilson_coefficients(np.array([0.3, 0.7, 0.]))
+    v, v_ref = ev.values(overflow='all'), h_err.values(overflow='all')
+    diff_copy = max(np.max(np.abs(v[key] - v_ref[key])) for key in v_ref)
+    ev.set_wc('ctG', 0.)
+    unchanged = all(np.allclose(ev.values(overflow='all')[key], kept[key], rtol=0, atol=tolerance) for key in kept)
+
+    unit_chk = (diff < tolerance) and no_sumw2 and (diff_copy < tolerance) and unchanged
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if unit_chk else 'Failed'
+    print('--- UNIT 3 ---')
+    print('difference: ', diff)
+    print('tolerance : ', tolerance)
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_eft_helper_shared():
+    all_chks,units = [0]*2
+
+    wc_names = ['cA','cB','cC']
+
+    print('Running unit tests for the shared EFTHelpers')
+
+    # All the histograms with the same WCs (and their copies) use the same helper, built by a single thread
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        helpers = list(pool.map(lambda i: EFTHelper.shared(list(wc_names)), range(16)))
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    h2 = h.sum('n')
+    unit_chk = all(helper is helpers[0] for helper in helpers) and (h._eft_helper is helpers[0]) and (h2._eft_helper is helpers[0])
+    all_chks += unit_chk
+    units += 1
+
+    # The w**2 tables are only built when needed
+    lazy = helpers[0]._quartic_tables is None
+    n_w2 = helpers[0].get_w2_coeffs()
+    unit_chk = lazy and (helpers[0]._quartic_tables is None) and (n_w2 == len(helpers[0].quartic_unique_factors))
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_pickle():
+    all_chks,units = [0]*2
+
+    wc_names = ['c%i' % i for i in range(26)]
+
+    print('Running unit tests for the pickling of HistEFT')
+
+    h = HistEFT("h", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), compact=True)
+    coeffs = np.zeros((10, h._ncoeffs))
+    coeffs[:, :3] = np.random.rand(10, 3)
+    h.fill(sample='ttH', n=np.arange(10) % 4, eft_coeff=coeffs)
+    h.set_wilson_coefficients(np.linspace(0, 1, 26))
+    h.values()
+
+    # Neither the helper (and its tables), the cached values nor the empty bookkeeping are shipped
+    state = h.__getstate__()
+    h2 = pickle.loads(pickle.dumps(h))
+    unit_chk = not any(name in state for name in ('_eft_helper', '_values_cache', '_sumw_comp', '_share_group'))
+    unit_chk = unit_chk and (h2._eft_helper is h._eft_helper) and (h2._ncoeffs == h._ncoeffs) and (h2._nerrcoeffs == h._nerrcoeffs)
+    unit_chk = unit_chk and np.allclose(h2.values()[('ttH',)], h.values()[('ttH',)])
+    all_chks += unit_chk
+    units += 1
+
+    # The unpickled histogram can be filled and added as usual
+    h2.fill(sample='ttbar', n=np.arange(10) % 4, eft_coeff=coeffs)
+    h2 += h
+    unit_chk = np.allclose(h2.values()[('ttH',)], 2*h.values()[('ttH',)]) and np.allclose(h2.values()[('ttbar',)], h.values()[('ttH',)])
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_freeze():
+    all_chks,units = [0]*2
+
+    wc_names = ['cA','cB']
+
+    print('Running unit tests for freezing HistEFTs at WC points')
+
+    h = HistEFT("Events", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    coeffs = np.random.rand(20, h._ncoeffs)
+    h.fill(sample='ttH', n=np.arange(20) % 5, eft_coeff=coeffs, eft_err_coeff=np.random.rand(20, h._nerrcoeffs))
+    h.fill(sample='ttZ', n=np.arange(20) % 4, eft_coeff=coeffs)
+    sm = hist.Hist("Events", hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    sm.fill(sample='ttbar', n=np.arange(4), weight=np.ones(4))
+    output = {'n': h, 'sm': sm}
+
+    # Plain hists with the same contents (and errors) as the HistEFT at each point, other objects are kept
+    points = [{}, {'cA': 1.}, {'cA': -0.5, 'cB': 2.}]
+    frozen = freeze(output, points)
+    unit_chk = all(not isinstance(out['n'], HistEFT) and out['sm'] is sm for out in frozen)
+    for out, point in zip(frozen, points):
+        h.set_wilson_coefficients(np.array([point.get(wc, 0.) for wc in wc_names]))
+        ref, val = h.values(sumw2=True, overflow='all'), out['n'].values(sumw2=True, overflow='all')
+        unit_chk = unit_chk and all(np.allclose(val[k][0], ref[k][0]) and np.allclose(val[k][1], ref[k][1]) for k in ref)
+    all_chks += unit_chk
+    units += 1
+
+    # Cube with all the sparse bins
+    keys, cube = freeze_cube(h, points)
+    h.set_wilson_coefficients(np.array([-0.5, 2.]))
+    unit_chk = (keys == [('ttH',), ('ttZ',)]) and (cube.shape == (3, 2, 4)) and np.allclose(cube[2, 1], h.values()[('ttZ',)])
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_set():
+    all_chks,units = [0]*2
+
+    wc_names = ['cA','cB']
+
+    print('Running unit tests for HistEFTSet')
+
+    output = {}
+    for var in ['njets', 'met']:
+        h = HistEFT("Events", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin(var,  "", 4, 0, 4))
+        for sample in ['ttH_a', 'ttH_b', 'ttZ']:
+            for channel in ['2l', '3l', '4l']:
+                h.fill(sample=sample, channel=channel, **{var: np.arange(8) % 5}, eft_coeff=np.random.rand(8, h._ncoeffs))
+        output[var] = h
+    output['sow'] = HistEFT("SumOfWeights", wc_names, hist.Bin("sow",  "", 1, 0, 2))
+    output['sow'].fill(sow=np.ones(4), eft_coeff=np.random.rand(4, h._ncoeffs))
+    mapping = {'ttH': 'ttH*', 'ttV': ['ttZ']}
+
+    # Same as doing the operations one histogram at a time, histograms without the axes are kept
+    process = hist.Cat("process", "process")
+    grouped = HistEFTSet(output).group('sample', process, mapping)
+    hists = grouped.integrate('channel', ['2l', '3l'])
+    unit_chk = hists['sow'] is output['sow']
+    # Each grouped histogram has its own process axis
+    unit_chk = unit_chk and len({id(ax) for ax in [process, grouped['njets'].axis('process'), grouped['met'].axis('process')]}) == 3
+    for var in ['njets', 'met']:
+        ref = output[var].group('sample', hist.Cat("process", "process"), mapping).integrate('channel', ['2l', '3l']).values(overflow='all')
+        val = hists[var].values(overflow='all')
+        unit_chk = unit_chk and (ref.keys() == val.keys()) and all(np.allclose(val[k], ref[k]) for k in ref)
+    all_chks += unit_chk
+    units += 1
+
+    # sum and scale
+    summed = HistEFTSet(output).sum('sample', 'channel')
+    summed.scale(2.)
+    unit_chk = all(np.allclose(summed[var].values()[()], 2*output[var].sum('sample', 'channel').values()[()]) for var in ['njets', 'met'])
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_scratch():
+    all_chks,units = [0]*2
+
+    wc_names = ['cA','cB']
+
+    print('Running unit tests for HistEFT with the coefficients in memory-mapped files')
+
+    chunk_bytes = CoeffBlock._chunk_bytes
+    CoeffBlock._chunk_bytes = 1024 # Process a few rows at a time
+    with tempfile.TemporaryDirectory() as scratch:
+        hists = []
+        for options in [{'contiguous': True}, {'scratch': scratch}]:
+            rng = np.random.default_rng(5)
+            h = HistEFT("Events", wc_names, hist.Cat("sample", "sample"), hist.Cat("channel", "channel"), hist.Bin("n",  "", 4, 0, 4), eft_errors=True, **options)
+            h2 = h.copy(content=False)
+            for sample in range(6):
+                for channel in range(8):
+                    h.fill(sample='s%i' % sample, channel='c%i' % channel, n=rng.integers(0, 4, 10), eft_coeff=rng.random((10, h._ncoeffs)))
+                    h2.fill(sample='s%i' % (sample+2), channel='c%i' % channel, n=rng.integers(0, 4, 10), eft_coeff=rng.random((10, h._ncoeffs)))
+            h += h2
+            h.scale(2.)
+            h.set_wilson_coefficients(np.array([1., -0.5]))
+            hists.append(h)
+        on_disk = hists[1]._sumw.on_disk and not hists[0]._sumw.on_disk
+
+        # Same results as in memory
+        unit_chk = on_disk
+        for func in [lambda h: h.values(sumw2=True), lambda h: h.sum('channel').values(sumw2=True), lambda h: h.rebin('n', hist.Bin("n",  "", 2, 0, 4)).values()]:
+            ref, val = func(hists[0]), func(hists[1])
+            unit_chk = unit_chk and (ref.keys() == val.keys()) and all(np.allclose(val[k], ref[k]) for k in ref)
+        all_chks += unit_chk
+        units += 1
+
+        # Merging outputs into the scratch directory
+        merged = merge_to_scratch([{'n': hists[0].copy()}, {'n': hists[0].copy()}], scratch)
+        ref = hists[0].values()
+        unit_chk = merged['n']._sumw.on_disk and all(np.allclose(merged['n'].values()[k], 2*ref[k]) for k in ref)
+        all_chks += unit_chk
+        units += 1
+        del hists, merged, h, h2
+    CoeffBlock._chunk_bytes = chunk_bytes
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_linear():
+    all_chks,units = [0]*2
+
+    wc_names = ['cA','cB','cC']
+
+    print('Running unit tests for linear-only HistEFT')
+
+    helper = EFTHelper(wc_names)
+    coeffs = np.random.rand(40, helper.get_w_coeffs())
+    n = np.arange(40) % 4
+    # The same events, with the quadratic terms removed
+    linear_coeffs = np.zeros_like(coeffs)
+    linear_idx = EFTHelper(wc_names, linear=True).get_full_indices()
+    linear_coeffs[:, linear_idx] = coeffs[:, linear_idx]
+
+    h_lin = HistEFT("Events", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4), linear=True)
+    h_lin.fill(sample='ttH', n=n, eft_coeff=coeffs, eft_err_coeff=helper.calc_w2_coeffs(coeffs))
+    h_ref = HistEFT("Events", wc_names, hist.Cat("sample", "sample"), hist.Bin("n",  "", 4, 0, 4))
+    h_ref.fill(sample='ttH', n=n, eft_coeff=linear_coeffs, eft_err_coeff=helper.calc_w2_coeffs(linear_coeffs))
+
+    # Only 1+nwc coefficients per bin, same yields and errors as the quadratic histogram without quadratic terms
+    point = np.array([0.5, -1., 2.])
+    h_lin.set_wilson_coefficients(point)
+    h_ref.set_wilson_coefficients(point)
+    val, ref = h_lin.values(sumw2=True)[('ttH',)], h_ref.values(sumw2=True)[('ttH',)]
+    unit_chk = (h_lin._sumw[list(h_lin._sumw)[0]].shape[-1] == 4) and np.allclose(val[0], ref[0]) and np.allclose(val[1], ref[1])
+    all_chks += unit_chk
+    units += 1
+
+    # Linear and quadratic histograms can't be added
+    try:
+        h_lin + h_ref
+        unit_chk = False
+    except ValueError:
+        unit_chk = True
+    all_chks += unit_chk
+    units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
+def test_histeft_mixed_bins():
+    all_chks,units = [0]*2
+
+    wc_names = ['cA','cB']
+
+    print('Running unit tests for HistEFT with EFT and regular bins and no dense axes')
+
+    for contiguous in [False, True]:
+        h = HistEFT("Events", wc_names, hist.Cat("sample", "sample"), contiguous=contiguous)
+        h.fill(sample='A', eft_coeff=np.array([[0.42, 0.1, 0, 0, 0, 0]]))
+        h.fill(sample='B', weight=np.array([1., 2.]))
+        h.fill(sample='B', weight=np.array([0.5]))
+
+        # The regular bin is not mistaken for an EFT bin
+        h.set_wilson_coefficients(np.array([1., 0.]))
+        vals = h.values(sumw2=True)
+        unit_chk = np.isclose(vals[('A',)][0], 0.52) and np.isclose(vals[('B',)][0], 3.5) and np.isclose(vals[('B',)][1], 5.25)
+        unit_chk = unit_chk and np.isclose(h.values_at(np.array([[0., 0.]]))[('B',)][0], 3.5)
+        all_chks += unit_chk
+        units += 1
+
+    chk_str = 'Passed' if all_chks == units else 'Failed'
+    print('--- UNIT 1 ---')
+    print('test: ', chk_str)
+    print('--------------\n')
+
+    ###########################
+
+    print(f'Passed Checks: {all_chks}/{units}')
+    return (all_chks == units)
+
 def run_unit_tests():
     all_chks = True
 
@@ -511,6 +1762,75 @@ def run_unit_tests():
     all_chks = test_histeft() and all_chks
     print()
 
+    all_chks = test_histeft_contiguous() and all_chks
+    print()
+
+    all_chks = test_histeft_values_at() and all_chks
+    print()
+
+    all_chks = test_histeft_fill_categories() and all_chks
+    print()
+
+    all_chks = test_histeft_eft_errors() and all_chks
+    print()
+
+    all_chks = test_histeft_float32() and all_chks
+    print()
+
+    all_chks = test_histeft_compact() and all_chks
+    print()
+
+    all_chks = test_histeft_merging() and all_chks
+    print()
+
+    all_chks = test_histeft_histio() and all_chks
+    print()
+
+    all_chks = test_histeft_values_cache() and all_chks
+    print()
+
+    all_chks = test_histeft_rebin() and all_chks
+    print()
+
+    all_chks = test_histeft_group() and all_chks
+    print()
+
+    all_chks = test_histeft_views() and all_chks
+    print()
+
+    all_chks = test_histeft_scale_dense() and all_chks
+    print()
+
+    all_chks = test_histeft_derivatives() and all_chks
+    print()
+
+    all_chks = test_scan() and all_chks
+    print()
+
+    all_chks = test_eft_evaluator() and all_chks
+    print()
+
+    all_chks = test_eft_helper_shared() and all_chks
+    print()
+
+    all_chks = test_histeft_pickle() and all_chks
+    print()
+
+    all_chks = test_freeze() and all_chks
+    print()
+
+    all_chks = test_histeft_set() and all_chks
+    print()
+
+    all_chks = test_histeft_scratch() and all_chks
+    print()
+
+    all_chks = test_histeft_linear() and all_chks
+    print()
+
+    all_chks = test_histeft_mixed_bins() and all_chks
+    print()
+
     print('All unit tests completed successfully!') if all_chks else print('Some unit tests failed!')
 
     return